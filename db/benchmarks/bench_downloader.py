@@ -0,0 +1,135 @@
+"""
+Throughput of download_wiki_articles.py against a local fake Wikipedia (fake_wiki_server.py, run in
+its own process). Reports titles/sec, retries, 429s, time spent sleeping before retries and peak
+memory for each combination of workers and retry settings.
+
+    python3 benchmarks/bench_downloader.py --titles 1000 --workers 25,50,100 --rate-limit 300 --error-rate 0.02
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.request import urlopen
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import download_wiki_articles as downloader  # noqa: E402
+from fake_wiki_server import SUMMARY_PATH, API_PATH, add_server_arguments, server_options  # noqa: E402
+
+
+def rss_bytes():
+    """Resident memory of this process, None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class PeakMemory:
+    """
+    Samples the resident memory while the downloader runs. tracemalloc would slow the
+    fetching threads down several times and skew the throughput.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.start = rss_bytes()
+        self.peak = self.start
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        if self.start is not None:
+            self._thread.join()
+
+    @property
+    def growth(self):
+        return None if self.start is None else self.peak - self.start
+
+
+@contextlib.contextmanager
+def fake_server(args):
+    """Starts fake_wiki_server.py on a free port and yields its base URL."""
+    options = []
+    for name, value in server_options(args).items():
+        options += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_wiki_server.py"), "--port", "0", *options],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        yield process.stdout.readline().split()[-1]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(titles, workers, retries, retry_delay, url) -> dict:
+    downloader.WIKI_SUMMARY_API = url + SUMMARY_PATH
+    downloader.WIKI_FULLTEXT_API = url + API_PATH
+    downloader.ARTICLE_WORKERS = workers
+    downloader.ARTICLE_RETRIES = retries
+    downloader.ARTICLE_RETRY_DELAY_S = retry_delay
+    downloader.stats.reset()
+    entries = [{"article": f"Article_{i}", "daily_views": i} for i in range(titles)]
+
+    start = time.perf_counter()
+    # The downloader prints a line per failed request
+    with contextlib.redirect_stdout(io.StringIO()), PeakMemory() as memory:
+        downloader.fetch_articles(entries)
+    seconds = time.perf_counter() - start
+
+    with urlopen(url + "/_stats") as response:
+        server = json.load(response)
+    return {"seconds": seconds, "peak": memory.peak, "growth": memory.growth, "server": server, **downloader.stats.snapshot()}
+
+
+def print_result(workers, retries, retry_delay, result):
+    print(f"workers={workers} retries={retries} retry_delay={retry_delay}s")
+    print(f"   throughput:     {result['articles'] / result['seconds']:.1f} titles/sec "
+          f"({result['articles']} fetched, {result['failed']} failed in {result['seconds']:.1f}s)")
+    print(f"   requests:       {result['requests']} ({result['rate_limited']} rate limited, "
+          f"{result['http_errors']} other errors, {result['request_errors']} not answered)")
+    print(f"   retries:        {result['retries']}, {result['retry_sleep_s']:.0f}s of thread time asleep, "
+          f"{result['wasted_sleep_s']:.0f}s on titles that failed anyway")
+    if result["peak"] is not None:
+        print(f"   peak memory:    {result['peak'] / 1e6:.1f} MB resident, {result['growth'] / 1e6:.1f} MB above the start of the run")
+    print(f"   server:         {result['server']}")
+
+
+def csv_list(kind):
+    return lambda value: [kind(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=500)
+    parser.add_argument("--workers", type=csv_list(int), default=[downloader.ARTICLE_WORKERS],
+                        help="comma separated ARTICLE_WORKERS values to compare")
+    parser.add_argument("--retries", type=csv_list(int), default=[downloader.ARTICLE_RETRIES])
+    parser.add_argument("--retry-delay", type=csv_list(float), default=[downloader.ARTICLE_RETRY_DELAY_S])
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    for workers, retries, retry_delay in itertools.product(args.workers, args.retries, args.retry_delay):
+        # A fresh server per run, so the rate limit bucket and response counts start over
+        with fake_server(args) as url:
+            print_result(workers, retries, retry_delay, run(args.titles, workers, retries, retry_delay, url))
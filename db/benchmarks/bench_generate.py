@@ -0,0 +1,222 @@
+"""
+CPU time, memory and Elasticsearch payload per /generate search, against an in-memory
+Elasticsearch stand-in with realistic article sizes. No ES server or Gemini key is needed.
+
+    python3 benchmarks/bench_generate.py --runs 30 --mode exhaustive
+    python3 benchmarks/bench_generate.py --runs 3 --log-level DEBUG   # also exercises the debug logging
+
+--baseline runs the same benchmark against the search code of another git revision and prints
+both side by side, e.g. against the dict based searches before Candidate records:
+
+    python3 benchmarks/bench_generate.py --baseline "$(git log --format=%h -1 -S'class Candidate' -- es_gen_models.py)^"
+
+Errors logged while searching make the run exit with status 1.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Keep the benchmark away from the real caches, related index and log output
+os.environ.setdefault("NEGATIVE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "negative.sqlite"))
+os.environ.setdefault("RELATED_INDEX_DIR", os.path.join(tempfile.mkdtemp(), "related"))
+if "--log-level" in sys.argv[:-1]:
+    # structured_log reads LOG_LEVEL when it is imported
+    os.environ["LOG_LEVEL"] = sys.argv[sys.argv.index("--log-level") + 1]
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+DB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DB_DIR)
+
+from es_gen_models import searchV3, get_search_settings, parse_keywords  # noqa: E402
+from structured_log import LOGGER_NAME  # noqa: E402
+
+
+class ErrorCount(logging.Handler):
+    """Counts the errors the search logs; they are swallowed there, so the timings alone would hide them."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.errors = 0
+
+    def emit(self, record):
+        self.errors += 1
+
+
+class BenchES:
+    """
+    Answers search, msearch and mget from an in-memory corpus. Responses go through
+    json.dumps / json.loads like the real client's transport, so payload size shows up in the numbers.
+    """
+
+    def __init__(self, articles=2000, content_chars=4000, hits=50, seed=0, mapping_version=2):
+        rnd = random.Random(seed)
+        words = [f"word{i}" for i in range(500)]
+        self.docs = {}
+        for i in range(articles):
+            title = f"Article {i}"
+            content = " ".join(rnd.choice(words) for _ in range(content_chars // 8))
+            self.docs[title] = {
+                "title": title,
+                "daily_views": rnd.randint(0, 50000),
+                "wikipedia_content": content,
+                "source_url": f"https://en.wikipedia.org/wiki/Article_{i}",
+            }
+        self.titles = sorted(self.docs)
+        self.hits = hits
+        self.mapping_version = mapping_version
+        self.response_bytes = 0
+        self.requests = 0
+        self.indices = self
+
+    # indices.exists
+    def exists(self, index):
+        return True
+
+    # indices.get
+    def get(self, index, **kwargs):
+        return {f"{index}-1": {
+            "settings": {"index": {"uuid": "bench", "creation_date": "0"}},
+            "mappings": {"_meta": {"mapping_version": self.mapping_version}},
+        }}
+
+    def options(self, **kwargs):
+        return self
+
+    def _transport(self, body):
+        raw = json.dumps(body)
+        self.response_bytes += len(raw)
+        self.requests += 1
+        return json.loads(raw)
+
+    def _source(self, doc, source):
+        if source is None or source is True:
+            return doc
+        return {key: doc[key] for key in source if key in doc}
+
+    def _hit(self, doc, score, source, fields):
+        hit = {"_id": doc["title"], "_score": score}
+        if source is not False:
+            hit["_source"] = self._source(doc, source)
+        if fields:
+            hit["fields"] = {key: [doc[key]] for key in fields if key in doc}
+        return hit
+
+    def _hits(self, query, size, source, fields=()):
+        rnd = random.Random(json.dumps(query, sort_keys=True, default=str))
+        titles = rnd.sample(self.titles, min(size, self.hits))
+        return {"hits": {"hits": [self._hit(self.docs[title], rnd.random() * 10, source, fields) for title in titles]}}
+
+    def search(self, index=None, query=None, size=10, _source=None, stored_fields=(), docvalue_fields=(), **kwargs):
+        return self._transport(self._hits(query, size, _source, [*stored_fields, *docvalue_fields]))
+
+    def msearch(self, searches, **kwargs):
+        return self._transport({"responses": [
+            self._hits(body["query"], body.get("size", 10), body.get("_source"))
+            for body in searches[1::2]
+        ]})
+
+    def mget(self, index=None, ids=None, _source=None, **kwargs):
+        return self._transport({"docs": [
+            {"_id": i, "found": True, "_source": self._source(self.docs[i], _source)} if i in self.docs
+            else {"_id": i, "found": False}
+            for i in ids
+        ]})
+
+
+def run(runs, mode, seed, mapping_version=2) -> dict:
+    es = BenchES(seed=seed, mapping_version=mapping_version)
+    errors = ErrorCount()
+    logging.getLogger(LOGGER_NAME).addHandler(errors)
+    search = get_search_settings(mode)
+    rnd = random.Random(seed)
+    queries = [f"{rnd.choice(es.titles)}, {rnd.choice(es.titles)}" for _ in range(runs)]
+
+    cpu = []
+    peaks = []
+    for query in queries:
+        tracemalloc.start()
+        start = time.process_time()
+        searchV3(es, True, parse_keywords(query), 5, search=search)
+        cpu.append(time.process_time() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    cpu.sort()
+    return {
+        "cpu_median_ms": cpu[len(cpu) // 2] * 1000,
+        "cpu_p90_ms": cpu[int(len(cpu) * 0.9)] * 1000,
+        "peak_memory_mb": sum(peaks) / len(peaks) / 1e6,
+        "es_requests": es.requests / runs,
+        "es_payload_mb": es.response_bytes / runs / 1e6,
+        "errors": errors.errors,
+    }
+
+
+def run_baseline(revision, argv) -> dict:
+    """Runs this script in a `git archive` of `revision`, so it imports that revision's search code."""
+    tree = tempfile.mkdtemp(prefix="bench-baseline-")
+    try:
+        archive = subprocess.run(["git", "archive", revision, "."], cwd=DB_DIR, check=True, capture_output=True).stdout
+        subprocess.run(["tar", "-x", "-C", tree], input=archive, check=True)
+        os.makedirs(os.path.join(tree, "benchmarks"), exist_ok=True)
+        shutil.copy(os.path.abspath(__file__), os.path.join(tree, "benchmarks", "bench_generate.py"))
+        output = subprocess.run(
+            [sys.executable, os.path.join(tree, "benchmarks", "bench_generate.py"), *argv, "--json"],
+            cwd=tree, check=True, capture_output=True, text=True
+        ).stdout
+        # With a verbose LOG_LEVEL the log lines share stdout with the result
+        return json.loads(next(line for line in reversed(output.splitlines()) if line.startswith('{"cpu_median_ms"')))
+    finally:
+        shutil.rmtree(tree, ignore_errors=True)
+
+
+RESULT_LINES = [
+    ("cpu per generate, median", "cpu_median_ms", "{:.1f} ms"),
+    ("cpu per generate, p90", "cpu_p90_ms", "{:.1f} ms"),
+    ("peak traced memory, mean", "peak_memory_mb", "{:.2f} MB"),
+    ("ES requests per generate", "es_requests", "{:.1f}"),
+    ("ES payload per generate", "es_payload_mb", "{:.2f} MB"),
+]
+
+
+def print_results(results: dict):
+    """Prints one column per result (name -> run() output)."""
+    print(f"{'':28}" + "".join(f"{name:>14}" for name in results))
+    for label, key, fmt in RESULT_LINES:
+        print(f"{label:28}" + "".join(f"{fmt.format(result[key]):>14}" for result in results.values()))
+    for name, result in results.items():
+        if result["errors"]:
+            print(f"❌ {name}: {result['errors']} errors logged while searching")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--mode", default="exhaustive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mapping-version", type=int, default=2, help="mapping version the stand-in index reports")
+    parser.add_argument("--log-level", default=os.environ["LOG_LEVEL"], help="LOG_LEVEL of the search, DEBUG to check the debug logging too")
+    parser.add_argument("--baseline", help="git revision whose search code is measured next to the working tree")
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON line")
+    args = parser.parse_args()
+
+    results = {}
+    if args.baseline:
+        argv = ["--runs", str(args.runs), "--mode", args.mode, "--seed", str(args.seed),
+                "--mapping-version", str(args.mapping_version), "--log-level", args.log_level]
+        results[args.baseline] = run_baseline(args.baseline, argv)
+    results["current"] = run(args.runs, args.mode, args.seed, args.mapping_version)
+
+    if args.json:
+        print(json.dumps(results["current"]))
+    else:
+        print(f"mode={args.mode} runs={args.runs} mapping=v{args.mapping_version}")
+        print_results(results)
+    sys.exit(1 if any(result["errors"] for result in results.values()) else 0)
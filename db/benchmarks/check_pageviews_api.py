@@ -0,0 +1,125 @@
+"""
+Runs the pageviews_api.py fetchers against fake_wiki_server.py and checks what they return:
+categorymembers pagination and subcategories, deduplicated titles, pageview totals, unknown pages,
+and recovery from (or failure on) 429 and 5xx responses. Exits with status 1 on a failed check.
+
+    python3 benchmarks/check_pageviews_api.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+import pageviews_api  # noqa: E402
+from fake_wiki_server import FakeWikiServer, API_PATH, PAGEVIEWS_PATH  # noqa: E402
+
+CATEGORY = "Checks"
+START, END = "2024-01-01", "2024-01-10"
+DAYS = 10
+
+failures = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {name}{f' ({detail})' if detail and not ok else ''}")
+    if not ok:
+        failures.append(name)
+
+
+def expected_titles(server: FakeWikiServer, category: str, depth: int) -> list:
+    """The category's articles and those of its subcategories down to depth levels, each once."""
+    titles = []
+    level = [category]
+    for _ in range(depth + 1):
+        next_level = []
+        for name in level:
+            for member in server.category_members(name):
+                if member["ns"] == 0:
+                    if member["title"] not in titles:
+                        titles.append(member["title"])
+                else:
+                    next_level.append(member["title"].split(":", 1)[1])
+        level = next_level
+    return titles
+
+
+def fetch(server: FakeWikiServer, depth: int = 1, workers: int = 8) -> list:
+    return pageviews_api.fetch_category_pageviews(
+        CATEGORY, START, END, depth, workers,
+        wiki_api_url=server.url + API_PATH, pageviews_api_url=server.url + PAGEVIEWS_PATH
+    )
+
+
+def serve(**options) -> FakeWikiServer:
+    server = FakeWikiServer(0, latency_ms=1, jitter_ms=0, **options)
+    server.start()
+    return server
+
+
+def check_listing_and_views(args):
+    server = serve(category_size=args.category_size, missing_rate=0.05)
+    try:
+        rows = fetch(server)
+    finally:
+        server.shutdown()
+
+    titles = [row["label"] for row in rows]
+    expected = expected_titles(server, CATEGORY, 1)
+    check("every article of the category and its subcategories is listed once",
+          sorted(titles) == sorted(expected), f"{len(titles)} listed, {len(expected)} expected")
+    check("categories larger than one page are followed through cmcontinue", server.continued > 0)
+    check("subcategories below the requested depth are not listed",
+          not any(title.count(" ~") > 1 for title in titles))
+
+    wrong = [row for row in rows if row["sum"] != (0 if server.is_missing(row["label"]) else server.daily_views(row["label"]) * DAYS)]
+    check("pageview totals add up every day of the range", not wrong, f"{len(wrong)} wrong, e.g. {wrong[:1]}")
+    missing = [row for row in rows if server.is_missing(row["label"])]
+    check("unknown pages (404) count as 0 views", bool(missing) and all(row["sum"] == 0 for row in missing))
+    check("rows are sorted by views", [row["sum"] for row in rows] == sorted((row["sum"] for row in rows), reverse=True))
+    check("averages are per day", all(abs(row["average"] - row["sum"] / DAYS) < 1e-9 for row in rows))
+
+
+def check_retries(args):
+    # 503s and a rate limit the 8 workers run into, retried by the session
+    server = serve(category_size=args.category_size, error_rate=0.05, rate_limit=400, burst=20, retry_after=0)
+    try:
+        rows = fetch(server, depth=0)
+    finally:
+        server.shutdown()
+    stats = server.stats()
+    check("the fake server sent 429 and 503 responses", "429" in stats and "503" in stats, str(stats))
+    check("every article is still fetched after retrying 429 and 503 responses",
+          len(rows) == args.category_size + 10, f"{len(rows)} rows, server {stats}")
+
+
+def check_failure():
+    # The category listing never succeeds: the fetch must fail rather than return a partial list
+    server = serve(error_rate=1.0)
+    start = time.monotonic()
+    try:
+        fetch(server, depth=0)
+        raised = False
+    except requests.exceptions.RequestException:
+        raised = True
+    finally:
+        server.shutdown()
+    check("a listing that keeps failing raises once the retries are used up", raised)
+    check("retries back off", time.monotonic() - start >= pageviews_api.PAGEVIEWS_BACKOFF_S)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--category-size", type=int, default=600, help="articles per fake category, above 490 to paginate")
+    args = parser.parse_args()
+    # Short backoffs keep the retry checks fast
+    pageviews_api.PAGEVIEWS_BACKOFF_S = 0.05
+
+    check_listing_and_views(args)
+    check_retries(args)
+    check_failure()
+    if failures:
+        raise SystemExit(f"❌ {len(failures)} checks failed")
+    print("✅ All pageviews_api checks passed")
@@ -0,0 +1,245 @@
+"""
+Local stand-in for the Wikipedia endpoints the ingestion scripts use: the REST page summary and
+the `action=query` extracts of api.php (download_wiki_articles.py), and the paginated
+`list=categorymembers` query and per-article pageviews (pageviews_api.py). Latency, server
+errors, missing pages and a 429 rate limit are configurable, so the scripts can be tuned and
+checked without hitting Wikipedia.
+
+    python3 benchmarks/fake_wiki_server.py --port 8081 --latency-ms 80 --rate-limit 200
+    WIKI_SUMMARY_API_URL=http://localhost:8081/api/rest_v1/page/summary/ \\
+    WIKI_API_URL=http://localhost:8081/w/api.php python3 download_wiki_articles.py
+    PAGEVIEWS_API_URL=http://localhost:8081/api/rest_v1/metrics/pageviews ...
+
+Every category has --category-size articles, a few shared with its siblings, and, down to
+CATEGORY_TREE_DEPTH levels, --subcategories subcategories named "<category> ~<n>".
+
+GET /_stats returns the responses sent so far by status code.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+SUMMARY_PATH = "/api/rest_v1/page/summary/"
+API_PATH = "/w/api.php"
+PAGEVIEWS_PATH = "/api/rest_v1/metrics/pageviews"
+PER_ARTICLE_PATH = PAGEVIEWS_PATH + "/per-article/"
+
+# categorymembers page size for cmlimit=max, like Wikipedia's for normal users
+CATEGORY_PAGE_SIZE = 500
+CATEGORY_TREE_DEPTH = 2
+# Articles every category has in common with the other categories
+SHARED_ARTICLES = 10
+CATEGORY_NAMESPACE = 14
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second with bursts of up to `burst`. A rate of 0 allows everything."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class FakeWikiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The downloader opens a connection per request from up to ARTICLE_WORKERS threads
+    request_queue_size = 256
+
+    def __init__(self, port=0, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, missing_rate=0.0,
+                 rate_limit=0.0, burst=50, retry_after=1, content_chars=20000, category_size=600,
+                 subcategories=2, seed=0):
+        super().__init__(("127.0.0.1", port), FakeWikiHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.limiter = RateLimiter(rate_limit, burst)
+        self.retry_after = retry_after
+        self.category_size = category_size
+        self.subcategories = subcategories
+        self.seed = seed
+        rnd = random.Random(seed)
+        words = [f"word{i}" for i in range(500)]
+        self.content = " ".join(rnd.choice(words) for _ in range(content_chars // 8))
+        self.responses = {}
+        # categorymembers requests for a page after the first
+        self.continued = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, status: int):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {str(status): count for status, count in sorted(self.responses.items())}
+
+    def is_missing(self, title: str) -> bool:
+        """Missing pages are fixed per title, like real ones, so retrying them never helps."""
+        return zlib.crc32(f"{self.seed}:{title}".encode()) % 10000 < self.missing_rate * 10000
+
+    def category_members(self, category: str) -> list:
+        """Members of "Category:<category>" as categorymembers entries, subcategories first."""
+        members = []
+        if category.count(" ~") < CATEGORY_TREE_DEPTH:
+            members += [{"ns": CATEGORY_NAMESPACE, "title": f"Category:{category} ~{i}"} for i in range(self.subcategories)]
+        members += [{"ns": 0, "title": f"Shared article {i}"} for i in range(SHARED_ARTICLES)]
+        members += [{"ns": 0, "title": f"{category} article {i}"} for i in range(self.category_size)]
+        return members
+
+    def daily_views(self, title: str) -> int:
+        return zlib.crc32(f"{self.seed}:views:{title}".encode()) % 1000
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class FakeWikiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+        self.server.count(status)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            self.send_json(200, server.stats())
+            return
+
+        # Rate limited requests are turned away before any work, like Wikipedia's edge does
+        if not server.limiter.allow():
+            headers = {"Retry-After": str(server.retry_after)} if server.retry_after else {}
+            self.send_json(429, {"title": "Too many requests"}, headers)
+            return
+        time.sleep(max(0.0, random.gauss(server.latency_ms, server.jitter_ms)) / 1000)
+        if random.random() < server.error_rate:
+            self.send_json(503, {"title": "Service unavailable"})
+            return
+
+        if url.path.startswith(SUMMARY_PATH):
+            title = unquote(url.path[len(SUMMARY_PATH):])
+            if server.is_missing(title):
+                self.send_json(404, {"title": "Not found."})
+                return
+            self.send_json(200, {
+                "title": title.replace("_", " "),
+                "content_urls": {"desktop": {"page": f"https://en.wikipedia.org/wiki/{title}"}},
+            })
+        elif url.path == API_PATH and parse_qs(url.query).get("list") == ["categorymembers"]:
+            self.category_members_page(parse_qs(url.query))
+        elif url.path.startswith(PER_ARTICLE_PATH):
+            self.article_views(url.path[len(PER_ARTICLE_PATH):].split("/"))
+        elif url.path == API_PATH:
+            title = parse_qs(url.query).get("titles", [""])[0]
+            if server.is_missing(title):
+                pages = {"-1": {"ns": 0, "title": title.replace("_", " "), "missing": ""}}
+            else:
+                page_id = str(zlib.crc32(title.encode()))
+                pages = {page_id: {"pageid": int(page_id), "ns": 0, "title": title.replace("_", " "),
+                                   "extract": f"{title}\n{server.content}"}}
+            self.send_json(200, {"batchcomplete": "", "query": {"pages": pages}})
+        else:
+            self.send_json(404, {"title": "Not found."})
+
+    def category_members_page(self, query: dict):
+        """One page of list=categorymembers; cmcontinue is the offset of the next page."""
+        category = query.get("cmtitle", [""])[0].split(":", 1)[-1]
+        offset = int(query.get("cmcontinue", ["0"])[0])
+        members = self.server.category_members(category)
+        if offset:
+            with self.server._lock:
+                self.server.continued += 1
+        body = {"batchcomplete": "", "query": {"categorymembers": members[offset:offset + CATEGORY_PAGE_SIZE]}}
+        if offset + CATEGORY_PAGE_SIZE < len(members):
+            body["continue"] = {"cmcontinue": str(offset + CATEGORY_PAGE_SIZE), "continue": "-||"}
+        self.send_json(200, body)
+
+    def article_views(self, parts: list):
+        """/per-article/{project}/{access}/{agent}/{article}/daily/{start}/{end}: the same views every day."""
+        if len(parts) != 7:
+            self.send_json(400, {"title": "Bad request"})
+            return
+        title = unquote(parts[3]).replace("_", " ")
+        if self.server.is_missing(title):
+            self.send_json(404, {"title": "Not found.", "detail": "The date(s) you used are valid, but we either do not have data for those date(s), or the project you asked for is not loaded yet."})
+            return
+        start, end = (datetime.strptime(day, "%Y%m%d").date() for day in parts[5:7])
+        views = self.server.daily_views(title)
+        items = [
+            {"article": parts[3], "timestamp": f"{start + timedelta(days=i):%Y%m%d}00", "views": views}
+            for i in range((end - start).days + 1)
+        ]
+        self.send_json(200, {"items": items})
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="share of titles without a page")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429s, 0 for no limit")
+    parser.add_argument("--burst", type=int, default=50, help="requests allowed at once above the rate limit")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s, 0 to leave the header out")
+    parser.add_argument("--content-chars", type=int, default=20000, help="size of each article extract")
+    parser.add_argument("--category-size", type=int, default=600, help="articles per category")
+    parser.add_argument("--subcategories", type=int, default=2, help="subcategories per category")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_options(args) -> dict:
+    return {
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+        "missing_rate": args.missing_rate, "rate_limit": args.rate_limit, "burst": args.burst,
+        "retry_after": args.retry_after, "content_chars": args.content_chars,
+        "category_size": args.category_size, "subcategories": args.subcategories, "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = FakeWikiServer(args.port, **server_options(args))
+    print(f"Fake Wikipedia listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,50 @@
+import json
+import os
+import shutil
+import numpy as np
+
+# Shared by the on-disk NumPy column stores (pageview_store.py, related_index.py)
+
+META_FILE = "meta.json"
+
+
+def pack_titles(titles) -> tuple:
+    """UTF-8 titles packed into one byte array, and the offsets of each title (one more than titles)."""
+    encoded = [title.encode("utf-8") for title in titles]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def unpack_title(title_bytes, title_offsets, i: int) -> str:
+    start, end = title_offsets[i], title_offsets[i + 1]
+    return title_bytes[start:end].tobytes().decode("utf-8")
+
+
+def save_columns(directory: str, columns: dict, meta: dict = None) -> str:
+    """
+    Writes every column to <name>.npy (and meta to meta.json) in a temporary directory first,
+    then swaps it in, so readers never see a half written store.
+    """
+    tmp = directory + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, column in columns.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), column)
+    if meta is not None:
+        with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def load_columns(directory: str, names) -> list:
+    """The named columns, memory-mapped so only the pages that are read get loaded."""
+    return [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names]
+
+
+def load_meta(directory: str) -> dict:
+    with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
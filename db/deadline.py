@@ -0,0 +1,45 @@
+import time
+
+
+class Deadline:
+    """
+    Time budget for a single request, passed through every stage it touches.
+    A Deadline created with seconds=None never expires.
+    """
+
+    def __init__(self, seconds: float = None):
+        self.budget = seconds
+        self.start = time.monotonic()
+        self.expires_at = None if seconds is None else self.start + seconds
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def fraction_left(self) -> float:
+        if self.expires_at is None:
+            return 1.0
+        return self.remaining() / self.budget if self.budget else 0.0
+
+    def clamp(self, timeout: float) -> float:
+        """Returns the timeout cut down to the time left in the budget."""
+        return min(timeout, self.remaining())
+
+    def scale(self, n: int, minimum: int = 1) -> int:
+        """Shrinks a work size (hits, articles) as the budget runs out."""
+        fraction = self.fraction_left()
+        if fraction >= 0.5:
+            return n
+        if fraction >= 0.25:
+            return max(minimum, n // 2)
+        return max(minimum, n // 4)
+
+    def __repr__(self):
+        return f"Deadline(budget={self.budget}, remaining={self.remaining():.2f})"
@@ -1,55 +1,166 @@
-from download_massviews import download_massviews
+from download_massviews import download_massviews, DOWNLOAD_DIR
+from download_wiki_articles import download_articles_for_category, write_corpus, TitleRegistry
+from pipeline import Stage, run_pipeline
+from pageview_store import PageviewStore, store_dir, list_stores
+import argparse
 import json
 import os
 
-DAILY_VIEW_THRESHOLD = 300
+DAILY_VIEW_THRESHOLD = int(os.getenv("DAILY_VIEW_THRESHOLD", "300"))
 CATEGORIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "categories.json")
 
-def process_massviews(filepath):
-    # Load the JSON file
-    try:
-        with open(filepath, "r", encoding="utf-8") as file:
-            data = json.load(file)
+def process_massviews(path, threshold=None):
+    """
+    Derive the thresholded {article, daily_views} list for a category from its pageview store.
+    `path` is a store directory, or a raw massviews JSON export that is first converted into a store.
+    The raw data is kept, so the list can be re-derived with another threshold without downloading again.
+    """
+    threshold = DAILY_VIEW_THRESHOLD if threshold is None else threshold
+
+    if os.path.isfile(path):
+        category = os.path.splitext(os.path.basename(path))[0]
+        try:
+            store = PageviewStore.from_json(path)
             print("JSON data loaded successfully!")
-    except FileNotFoundError:
-        print(f"File not found: {filepath}")
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-
-    # Filter and transform the data
-    thresheld_data = []
-    for item in data:
-        average = item.get("average", 0)
-        label = item.get("label", "No Label")
-        if average > DAILY_VIEW_THRESHOLD:
-            thresheld_data.append({
-                "article": label,
-                "daily_views": round(average)
-            })
+        except FileNotFoundError:
+            print(f"File not found: {path}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON: {e}")
+            return None
+        store.save(store_dir(category))
+    else:
+        category = os.path.basename(os.path.normpath(path))
+
+    try:
+        store = PageviewStore.load(store_dir(category))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error loading pageview data for {category}: {e}")
+        return None
+
+    # Vectorized filter over the average column, titles are only decoded for the kept rows
+    thresheld_data = list(store.records(store.threshold(threshold)))
 
+    filepath = os.path.join(DOWNLOAD_DIR, f"{category}.json")
     try:
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
         with open(filepath, "w", encoding="utf-8") as file:
-            json.dump(thresheld_data, file, indent=4)
-            print(f"Threshed data saved to {filepath}")
+            json.dump(thresheld_data, file, ensure_ascii=False)
+            print(f"Threshed data saved to {filepath} ({len(thresheld_data)} of {len(store)} articles)")
     except Exception as e:
         print(f"Error saving threshed data: {e}")
+        return None
+    return filepath
 
-if __name__ == "__main__":
+def rethreshold(threshold):
+    """Re-derive every category's title list from the stored pageviews, without downloading."""
+    return [process_massviews(store_dir(category), threshold) for category in list_stores()]
+
+def print_stats(threshold):
+    for category in list_stores():
+        store = PageviewStore.load(store_dir(category))
+        print(f"{category}: {json.dumps(store.stats(threshold))}")
+        top = ", ".join(f"{r['article']} ({r['daily_views']})" for r in store.records(store.top_k(5)))
+        print(f"  top: {top}")
+
+def load_categories():
     # Load categories from JSON file
     try:
         with open(CATEGORIES_FILE, "r", encoding="utf-8") as file:
-            categories = json.load(file)
+            return json.load(file)
     except FileNotFoundError:
         print("Error: categories.json file not found.")
-        categories = []
     except json.JSONDecodeError as e:
         print(f"Error decoding categories.json: {e}")
-        categories = []
+    return []
+
+def massviews_stage(category):
+    pageviews = download_massviews(category=category)
+    if pageviews:
+        return process_massviews(pageviews)
+    return None
 
-    # Download, process, and import each category
-    for category in categories:
-        massviews_file = download_massviews(category=category)
-        if massviews_file:
-            process_massviews(massviews_file)
+# Shared by the article workers so an article listed in several categories is fetched once
+registry = TitleRegistry()
+
+def articles_stage(massviews_file):
+    return download_articles_for_category(massviews_file, registry)
+
+def import_stage(articles_file):
+    # Imported lazily, elasticsearch_import requires ES_HOST to be set
+    from elasticsearch_import import import_data
+    import_data(articles_file)
+    return articles_file
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download, fetch and import every category in categories.json")
+    parser.add_argument("--massviews-workers", type=int, default=int(os.getenv("PIPELINE_MASSVIEWS_WORKERS", "3")),
+                        help="categories whose pageviews are downloaded at the same time")
+    parser.add_argument("--article-workers", type=int, default=int(os.getenv("PIPELINE_ARTICLE_WORKERS", "2")),
+                        help="category files whose articles are fetched at the same time")
+    parser.add_argument("--import-workers", type=int, default=int(os.getenv("PIPELINE_IMPORT_WORKERS", "1")),
+                        help="article files imported into Elasticsearch at the same time")
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv("PIPELINE_QUEUE_SIZE", "2")),
+                        help="finished items waiting between two stages before the earlier stage blocks")
+    parser.add_argument("--massviews-only", action="store_true",
+                        help="only download and threshold the pageview lists")
+    parser.add_argument("--no-import", action="store_true",
+                        help="stop after fetching the articles")
+    parser.add_argument("--no-related", action="store_true",
+                        help="do not rebuild the related article index from the new corpus")
+    parser.add_argument("--threshold", type=int, default=DAILY_VIEW_THRESHOLD,
+                        help="minimum average daily views for an article to be kept")
+    parser.add_argument("--rethreshold", action="store_true",
+                        help="only re-derive the title lists from stored pageviews with --threshold")
+    parser.add_argument("--stats", action="store_true",
+                        help="only print per-category pageview statistics")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    DAILY_VIEW_THRESHOLD = args.threshold
+
+    if args.stats:
+        print_stats(args.threshold)
+        raise SystemExit(0)
+    if args.rethreshold:
+        rethreshold(args.threshold)
+        raise SystemExit(0)
+
+    categories = load_categories()
+
+    # Category listing, article fetching and import overlap across categories
+    stages = [Stage("massviews", massviews_stage, args.massviews_workers)]
+    if not args.massviews_only:
+        stages.append(Stage("articles", articles_stage, args.article_workers))
+        if not args.no_import:
+            from elasticsearch_import import wait_for_es
+            wait_for_es()  # Ensure Elasticsearch is running
+            stages.append(Stage("import", import_stage, args.import_workers))
+
+    article_files = run_pipeline(categories, stages, args.queue_size)
+
+    if not args.massviews_only:
+        registry.report()
+        corpus_file = write_corpus(registry, article_files)
+        if not args.no_related:
+            from related_index import build_related_index
+            build_related_index()
+        if not args.no_import:
+            # Articles imported before a later category listed them get their merged views and
+            # categories, with the hash of their final corpus version so they are not sent again
+            from elasticsearch_import import update_fields, import_corpus, load_documents, content_hash, HASH_FIELD
+            corpus = load_documents(corpus_file)
+            changed = registry.changed_since_claim()
+            update_fields({
+                title: {**fields, HASH_FIELD: content_hash(corpus[title])}
+                for title, fields in changed.items() if title in corpus
+            })
+            # Removes documents that are no longer listed in any category. Listed articles whose fetch
+            # failed are kept, and nothing is removed when a whole category failed, since its titles are unknown.
+            stage_errors = {stage.name: stage.failed for stage in stages if stage.failed}
+            if stage_errors:
+                print(f"⚠️ Skipping the removal of missing documents, some categories failed: {stage_errors}")
+            import_corpus(delete_missing=not stage_errors, keep=registry.entries.keys())
 
     print("Massviews category data downloads complete")
\ No newline at end of file
@@ -2,15 +2,69 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import requests
 import os
+import threading
 import time
 
 # Read the original data file
 INPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/massviews")
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/articles")
 
-# Wikipedia API endpoints
-WIKI_SUMMARY_API = "https://en.wikipedia.org/api/rest_v1/page/summary/"
-WIKI_FULLTEXT_API = "https://en.wikipedia.org/w/api.php"
+# Single deduplicated article corpus covering every category
+CORPUS_FILE = os.path.join(OUTPUT_FOLDER, "corpus.json")
+
+# Threads fetching articles for one category file
+ARTICLE_WORKERS = int(os.getenv("ARTICLE_WORKERS", "100"))
+# How daily_views is combined for articles listed in several categories: "max" or "sum"
+DEDUP_VIEWS_MODE = os.getenv("DEDUP_VIEWS_MODE", "max")
+
+# Wikipedia API endpoints, overridable to run against a local stub server (see benchmarks/fake_wiki_server.py)
+WIKI_SUMMARY_API = os.getenv("WIKI_SUMMARY_API_URL", "https://en.wikipedia.org/api/rest_v1/page/summary/")
+WIKI_FULLTEXT_API = os.getenv("WIKI_API_URL", "https://en.wikipedia.org/w/api.php")
+# Attempts per article and the pause between them (the API occasionally blacks out for a few seconds)
+ARTICLE_RETRIES = int(os.getenv("ARTICLE_RETRIES", "5"))
+ARTICLE_RETRY_DELAY_S = float(os.getenv("ARTICLE_RETRY_DELAY_S", "6.0"))
+ARTICLE_REQUEST_TIMEOUT_S = float(os.getenv("ARTICLE_REQUEST_TIMEOUT_S", "30"))
+
+class DownloadStats:
+    """Counters of the article downloads of this process, shared by the fetching threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {
+                "articles": 0, "failed": 0, "requests": 0, "rate_limited": 0, "http_errors": 0,
+                "request_errors": 0, "retries": 0, "retry_sleep_s": 0.0, "wasted_sleep_s": 0.0,
+            }
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def record_response(self, response):
+        if response.status_code == 429:
+            self.add(requests=1, rate_limited=1)
+        elif response.status_code != 200:
+            self.add(requests=1, http_errors=1)
+        else:
+            self.add(requests=1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def report(self):
+        c = self.snapshot()
+        print(f"📊 {c['articles']} articles fetched, {c['failed']} failed, {c['requests']} requests "
+              f"({c['rate_limited']} rate limited, {c['http_errors']} other errors, {c['request_errors']} not answered), "
+              f"{c['retries']} retries, {c['retry_sleep_s']:.0f}s spent waiting to retry "
+              f"({c['wasted_sleep_s']:.0f}s on articles that failed anyway)")
+
+stats = DownloadStats()
 
 def fetch_wikipedia_content(title):
     """Fetch full Wikipedia page content and its URL"""
@@ -21,13 +75,15 @@ def fetch_wikipedia_content(title):
     summary_url = WIKI_SUMMARY_API + title
     page_url = ""
     try:
-        response = requests.get(summary_url)
+        response = requests.get(summary_url, timeout=ARTICLE_REQUEST_TIMEOUT_S)
+        stats.record_response(response)
         if response.status_code == 200:
             wiki_data = response.json()
             page_url = wiki_data.get("content_urls", {}).get("desktop", {}).get("page", "")
         else:
             print(f"⚠️ Wikipedia Summary API failed for {title}: {response.status_code}")
     except requests.exceptions.RequestException as e:
+        stats.add(requests=1, request_errors=1)
         print(f"⚠️ Wikipedia Summary API request failed: {e}")
 
     # Fetch full page content
@@ -39,7 +95,8 @@ def fetch_wikipedia_content(title):
         "titles": title
     }
     try:
-        response = requests.get(WIKI_FULLTEXT_API, params=fulltext_params)
+        response = requests.get(WIKI_FULLTEXT_API, params=fulltext_params, timeout=ARTICLE_REQUEST_TIMEOUT_S)
+        stats.record_response(response)
         if response.status_code == 200:
             wiki_data = response.json()
             pages = wiki_data.get("query", {}).get("pages", {})
@@ -48,15 +105,18 @@ def fetch_wikipedia_content(title):
                 return page_content, page_url
         print(f"⚠️ Wikipedia Fulltext API failed for {title}: {response.status_code}")
     except requests.exceptions.RequestException as e:
+        stats.add(requests=1, request_errors=1)
         print(f"⚠️ Wikipedia Fulltext API request failed: {e}")
 
     return "No content available.", page_url
 
-def process_article(item, retries=5):
-    """Process a single article and fetch Wikipedia content with retries."""
+def process_article(item, retries=None):
+    """Process a single article and fetch Wikipedia content with retries (ARTICLE_RETRIES by default)."""
+    retries = retries or ARTICLE_RETRIES
     # Handle both formats: "article" and "label"
     title = item.get("article") or item.get("label")
     daily_views = item.get("daily_views")
+    categories = item.get("categories")
     
     if not title or not isinstance(title, str):
         #print(f"⚠️ Skipping invalid article: {item}")
@@ -64,65 +124,207 @@ def process_article(item, retries=5):
 
     title = title.replace("_", " ")  # Convert to Wikipedia page format
 
+    slept = 0.0
     for attempt in range(1, retries + 1):
         wikipedia_content, source_url = fetch_wikipedia_content(title)
 
         if wikipedia_content != "No content available.":
             # print(f"✅ Processed: {title}")
-            return {
+            article = {
                 "title": title,
                 "wikipedia_content": wikipedia_content,
                 "source_url": source_url,
                 "daily_views": daily_views
             }
+            if categories is not None:
+                article["categories"] = categories
+            stats.add(articles=1, retries=attempt - 1, retry_sleep_s=slept)
+            return article
         else:
             print(f"⚠️ Attempt {attempt} failed for: {title}")
             if attempt < retries:
-                time.sleep(6.0) # Wait before retrying (api seems to occasionally blackout for a few seconds)
+                time.sleep(ARTICLE_RETRY_DELAY_S) # Wait before retrying (api seems to occasionally blackout for a few seconds)
+                slept += ARTICLE_RETRY_DELAY_S
                 # print(f"🔄 Retrying for: {title}...")
 
     print(f"❌ All {retries} attempts failed for: {title}")
+    stats.add(failed=1, retries=retries - 1, retry_sleep_s=slept, wasted_sleep_s=slept)
     return None  # Skip entries after exhausting retries
 
-def download_articles_for_category(input_file_path):
-    output_file_path = os.path.join(OUTPUT_FOLDER, os.path.basename(input_file_path))
+def category_name(massviews_file_path):
+    return os.path.splitext(os.path.basename(massviews_file_path))[0]
+
+def load_massviews(input_file_path):
     try:
         with open(input_file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
         print(f"📂 Loaded {len(data)} entries from {os.path.basename(input_file_path)}")
+        return data
     except (FileNotFoundError, json.JSONDecodeError):
         print(f"❌ Error: File {input_file_path} not found or not valid JSON!")
-        return
+        return None
+
+class TitleRegistry:
+    """
+    Merges the title lists of several categories so every article is fetched once.
+    Each entry keeps the combined daily_views (max or sum, see DEDUP_VIEWS_MODE)
+    and the list of categories the article appears in.
+    """
 
+    def __init__(self, views_mode=DEDUP_VIEWS_MODE):
+        self.views_mode = views_mode
+        self.entries = {}  # title -> {"article", "daily_views", "categories"}
+        self.claimed = {}  # title -> (daily_views, categories) when handed out for fetching
+        self.listed = 0
+        self.lock = threading.Lock()
+
+    def add(self, items, category):
+        """Merge a category's title list. Returns entries for the titles not seen before."""
+        new_entries = []
+        with self.lock:
+            for item in items:
+                title = item.get("article") or item.get("label")
+                if not title or not isinstance(title, str):
+                    continue
+                title = title.replace("_", " ")
+                views = item.get("daily_views") or 0
+                self.listed += 1
+
+                entry = self.entries.get(title)
+                if entry is None:
+                    entry = {"article": title, "daily_views": views, "categories": [category]}
+                    self.entries[title] = entry
+                    self.claimed[title] = (views, [category])
+                    new_entries.append(dict(entry, categories=[category]))
+                    continue
+
+                if category not in entry["categories"]:
+                    entry["categories"].append(category)
+                    if self.views_mode == "sum":
+                        entry["daily_views"] += views
+                if self.views_mode != "sum":
+                    entry["daily_views"] = max(entry["daily_views"], views)
+        return new_entries
+
+    def changed_since_claim(self):
+        """Fields of entries whose views or categories changed after they were handed out."""
+        with self.lock:
+            return {
+                title: {"daily_views": entry["daily_views"], "categories": list(entry["categories"])}
+                for title, entry in self.entries.items()
+                if self.claimed[title] != (entry["daily_views"], entry["categories"])
+            }
+
+    def report(self):
+        unique = len(self.entries)
+        overlap = self.listed / unique if unique else 1.0
+        print(f"📊 {self.listed} listed titles, {unique} unique articles (overlap factor {overlap:.2f})")
+
+def fetch_articles(entries):
+    """Fetch the Wikipedia content of every entry in parallel, skipping failures."""
     articles = []
 
     # Use ThreadPoolExecutor to parallelize the processing
-    with ThreadPoolExecutor(max_workers=100) as executor:
+    with ThreadPoolExecutor(max_workers=ARTICLE_WORKERS) as executor:
         # Submit tasks for each article
-        futures = {executor.submit(process_article, item): item for item in data}
+        futures = {executor.submit(process_article, item): item for item in entries}
 
         # Collect results as they complete
         for future in as_completed(futures):
             result = future.result()
             if result:
                 articles.append(result)
+    return articles
+
+def save_articles(articles, output_file_path):
+    with open(output_file_path, "w", encoding="utf-8") as f:
+        json.dump(articles, f, indent=4, ensure_ascii=False)
+
+def download_articles_for_category(input_file_path, registry: TitleRegistry = None):
+    """
+    Fetch every article listed in a massviews file. With a registry, articles already
+    claimed by another category are skipped. Returns the output file path, or None if nothing was saved.
+    """
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    output_file_path = os.path.join(OUTPUT_FOLDER, os.path.basename(input_file_path))
+    data = load_massviews(input_file_path)
+    if data is None:
+        return None
+
+    if registry is not None:
+        data = registry.add(data, category_name(input_file_path))
+        print(f"🔁 {len(data)} articles in {os.path.basename(input_file_path)} not fetched yet")
+
+    articles = fetch_articles(data)
 
     if articles:
-        with open(output_file_path, "w", encoding="utf-8") as f:
-            json.dump(articles, f, indent=4, ensure_ascii=False)
+        save_articles(articles, output_file_path)
         print(f"\n🎉 Wiki Download complete! Data saved to {os.path.basename(output_file_path)}")
-    else:
-        print("❌ No valid data found, output file is empty!")
+        return output_file_path
 
-def main():
+    print("❌ No valid data found, output file is empty!")
+    return None
+
+def write_corpus(registry: TitleRegistry, article_files):
+    """
+    Combine per-category article files into CORPUS_FILE with the merged daily_views
+    and categories of every article, then remove the per-category files.
+    """
+    articles = {}
+    for path in article_files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for article in json.load(f):
+                    articles[article["title"]] = article
+        except (FileNotFoundError, json.JSONDecodeError):
+            print(f"❌ Error: File {path} not found or not valid JSON!")
+
+    for title, article in articles.items():
+        entry = registry.entries.get(title)
+        if entry:
+            article["daily_views"] = entry["daily_views"]
+            article["categories"] = entry["categories"]
+
+    save_articles(list(articles.values()), CORPUS_FILE)
+    for path in article_files:
+        if os.path.abspath(path) != os.path.abspath(CORPUS_FILE) and os.path.exists(path):
+            os.remove(path)
+    print(f"🎉 Saved {len(articles)} deduplicated articles to {os.path.basename(CORPUS_FILE)}")
+    return CORPUS_FILE
+
+def download_corpus(massviews_files):
+    """Merge the title lists of every category, fetch each article once and save a single corpus."""
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    registry = TitleRegistry()
+    for path in massviews_files:
+        data = load_massviews(path)
+        if data is not None:
+            registry.add(data, category_name(path))
+    registry.report()
 
-    for filename in os.listdir(INPUT_FOLDER):
-        if filename.endswith(".json"):
-            input_file_path = os.path.join(INPUT_FOLDER, filename)
-            download_articles_for_category(input_file_path)
+    articles = fetch_articles(list(registry.entries.values()))
+    if not articles:
+        print("❌ No valid data found, output file is empty!")
+        return None
+
+    save_articles(articles, CORPUS_FILE)
+    # Per-category files from earlier runs would import stale copies of the same documents
+    for path in massviews_files:
+        stale = os.path.join(OUTPUT_FOLDER, os.path.basename(path))
+        if os.path.exists(stale):
+            os.remove(stale)
+    stats.report()
+    print(f"\n🎉 Wiki Download complete! {len(articles)} articles saved to {os.path.basename(CORPUS_FILE)}")
+    return CORPUS_FILE
+
+def main():
+    massviews_files = [
+        os.path.join(INPUT_FOLDER, filename)
+        for filename in sorted(os.listdir(INPUT_FOLDER))
+        if filename.endswith(".json")
+    ]
+    download_corpus(massviews_files)
 
 if __name__ == "__main__":
     print("Starting data download...")
     main()
-    
@@ -1,96 +1,252 @@
 import time
+import hashlib
 import json
 import requests
 import os
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import helpers
+from es_client import ES_HOSTS, ES_BULK_HOSTS, ES_REPLICAS, BULK, get_client
 
-# Configure Elasticsearch
-ES_HOST = os.getenv("ES_HOST")
-if not ES_HOST:
-    raise EnvironmentError("The environment variable 'ES_HOST' is not set. Do you have a .env file?")
+# Configure Elasticsearch (see es_client.py)
+if not (os.getenv("ES_HOSTS") or os.getenv("ES_HOST")):
+    raise EnvironmentError("The environment variable 'ES_HOST' (or 'ES_HOSTS') is not set. Do you have a .env file?")
 
 INDEX_NAME = "wikipedia"
 DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/articles")
-# Wait for Elasticsearch to start
+# Hash of the imported document, used to skip unchanged documents on the next import
+HASH_FIELD = "content_hash"
+# Documents per mget when looking up stored hashes
+HASH_LOOKUP_BATCH = 1000
+# Wait for Elasticsearch to start (any configured node answering is enough)
 def wait_for_es():
     while True:
-        try:
-            response = requests.get(ES_HOST, timeout=10)
-            if response.status_code == 200:
-                print("Elasticsearch is up and running")
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"Waiting for Elasticsearch to start... Error: {e}")
+        for host in dict.fromkeys(ES_HOSTS + ES_BULK_HOSTS):
+            try:
+                response = requests.get(host, timeout=10)
+                if response.status_code == 200:
+                    print("Elasticsearch is up and running")
+                    return
+            except requests.exceptions.RequestException as e:
+                print(f"Waiting for Elasticsearch to start at {host}... Error: {e}")
         time.sleep(5)
 
-def create_index_with_mapping(es, index_name):
-    mapping = {
+# Bumped on every mapping change and stored in the index _meta; migrate_index.py moves older indices over.
+# v2: stored title with a lowercase keyword subfield, index sorted by daily_views, doc values only where used.
+MAPPING_VERSION = 2
+# Primary shards of new indices, the corpus fits comfortably in one
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "1"))
+
+def index_mapping(settings=None):
+    """Settings and mappings of a new index; `settings` entries (e.g. refresh_interval) override the defaults."""
+    index_settings = {
+        "number_of_shards": INDEX_SHARDS,
+        "number_of_replicas": ES_REPLICAS,
+        # Segments are kept in descending daily_views order, so top articles by views
+        # can be read from the start of each segment without scoring the rest
+        "sort.field": "daily_views",
+        "sort.order": "desc",
+        "sort.missing": "_last",
+        **(settings or {}).get("index", {})
+    }
+    return {
+        "settings": {
+            **(settings or {}),
+            "index": index_settings,
+            "analysis": {
+                "normalizer": {
+                    "title_normalizer": {"type": "custom", "filter": ["lowercase", "asciifolding"]}
+                }
+            }
+        },
         "mappings": {
+            "_meta": {"mapping_version": MAPPING_VERSION},
             "properties": {
                 "title": {
                     "type": "text",
-                    "analyzer": "standard"
+                    "analyzer": "standard",
+                    # Stored apart from _source, so candidate searches can skip loading the article text
+                    "store": True,
+                    "fields": {
+                        # Exact, case insensitive title lookups (term queries only, so no doc values)
+                        "lower": {
+                            "type": "keyword",
+                            "normalizer": "title_normalizer",
+                            "ignore_above": 512,
+                            "doc_values": False
+                        }
+                    }
                 },
                 "wikipedia_content": {
                     "type": "text",
                     "analyzer": "english"  # Use the English analyzer for better text analysis
                 },
+                # Only returned with the article, never searched
                 "source_url": {
-                    "type": "keyword"
+                    "type": "keyword",
+                    "index": False,
+                    "doc_values": False
                 },
+                # Doc values for the index sort and for docvalue_fields in candidate searches
                 "daily_views": {
                     "type": "integer"
+                },
+                "categories": {
+                    "type": "keyword",
+                    "doc_values": False
+                },
+                HASH_FIELD: {
+                    "type": "keyword",
+                    "index": False,
+                    "doc_values": False
                 }
             }
         }
     }
 
+def create_index_with_mapping(es, index_name, settings=None):
     if not es.indices.exists(index=index_name):
-        es.indices.create(index=index_name, body=mapping)
-        print(f"Index '{index_name}' created with custom mapping.")
+        es.indices.create(index=index_name, body=index_mapping(settings))
+        print(f"Index '{index_name}' created with mapping v{MAPPING_VERSION}.")
     else:
         print(f"Index '{index_name}' already exists.")
 
-# Connect to Elasticsearch and import data
-def import_data(data_file):
-    es = Elasticsearch(ES_HOST)
-    create_index_with_mapping(es, INDEX_NAME)
+def content_hash(doc):
+    content = {k: v for k, v in doc.items() if k != HASH_FIELD}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
 
-    # Read JSON data
+def load_documents(data_file):
+    """Read an article file as a dict of document id -> document."""
     try:
         with open(data_file, "r", encoding="utf-8") as f:
             data = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Error loading JSON data: {e}")
-        return
-    
-    if not data:
+        return {}
+
+    # Use the "title" as the document ID to prevent duplicates
+    return {item["title"]: item for item in data if "title" in item}
+
+def indexed_hashes(es, index_name=INDEX_NAME, ids=None):
+    """
+    Stored content hashes (document id -> hash) of imported documents, for the given ids or the whole index.
+    Documents without a hash (e.g. added by the Wikipedia API fallback) are left out.
+    """
+    hashes = {}
+    if ids is None:
+        hits = helpers.scan(es, index=index_name, query={"query": {"match_all": {}}}, _source=[HASH_FIELD])
+    else:
+        ids = list(ids)
+        hits = []
+        for i in range(0, len(ids), HASH_LOOKUP_BATCH):
+            response = es.mget(index=index_name, ids=ids[i:i + HASH_LOOKUP_BATCH], _source=[HASH_FIELD])
+            hits.extend(doc for doc in response["docs"] if doc.get("found"))
+    for hit in hits:
+        value = hit.get("_source", {}).get(HASH_FIELD)
+        if value:
+            hashes[hit["_id"]] = value
+    return hashes
+
+def import_documents(es, docs, index_name=INDEX_NAME, delete_missing=False, keep=()):
+    """
+    Send only new or changed documents, comparing content hashes with the ones stored in the index.
+    With delete_missing, `docs` is the whole corpus and imported documents not in it are deleted,
+    except the ids in `keep` (e.g. articles still listed whose fetch failed this time).
+    Returns the counts of new, changed, unchanged, deleted, kept and failed documents.
+    """
+    stored = indexed_hashes(es, index_name, None if delete_missing else docs.keys())
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0, "kept": 0, "failed": 0}
+
+    actions = []
+    for doc_id, doc in docs.items():
+        doc_hash = content_hash(doc)
+        previous = stored.get(doc_id)
+        if previous == doc_hash:
+            counts["unchanged"] += 1
+            continue
+        counts["changed" if previous else "new"] += 1
+        actions.append({
+            "_index": index_name,
+            "_id": doc_id,
+            "_source": {**doc, HASH_FIELD: doc_hash}
+        })
+
+    if delete_missing:
+        for doc_id in stored.keys() - docs.keys():
+            if doc_id in keep:
+                counts["kept"] += 1
+                continue
+            counts["deleted"] += 1
+            actions.append({"_op_type": "delete", "_index": index_name, "_id": doc_id})
+
+    if actions:
+        success, errors = helpers.bulk(es, actions, raise_on_error=False)
+        counts["failed"] = len(errors)
+        if errors:
+            print(f"Some data is invalid, total {len(errors)} errors")
+
+    print(f"Imported into '{index_name}': {counts['new']} new, {counts['changed']} changed, "
+          f"{counts['unchanged']} unchanged, {counts['deleted']} deleted, {counts['kept']} kept without new content, "
+          f"{counts['failed']} failed")
+    return counts
+
+# Connect to Elasticsearch and import data
+def import_data(data_file):
+    es = get_client(BULK)
+    create_index_with_mapping(es, INDEX_NAME)
+
+    docs = load_documents(data_file)
+    if not docs:
+        print("No valid data to import")
+        return None
+
+    return import_documents(es, docs)
+
+def load_corpus(data_folder=DATA_FOLDER):
+    """Read every article file in the folder as one dict of document id -> document."""
+    docs = {}
+    for filename in sorted(os.listdir(data_folder)):
+        if filename.endswith(".json"):
+            file_path = os.path.join(data_folder, filename)
+            print(f"Loading data from {file_path}...")
+            docs.update(load_documents(file_path))
+    return docs
+
+# Import every article file in the folder as the full corpus: documents that
+# disappeared from the corpus since the last import are deleted from the index,
+# unless they are in `keep` or delete_missing is off
+def import_corpus(data_folder=DATA_FOLDER, delete_missing=True, keep=()):
+    es = get_client(BULK)
+    create_index_with_mapping(es, INDEX_NAME)
+
+    docs = load_corpus(data_folder)
+    if not docs:
+        # Never empty the index because the data folder is missing or empty
         print("No valid data to import")
-        return
+        return None
 
-    # Bulk import data
-    articles = [
+    return import_documents(es, docs, delete_missing=delete_missing, keep=keep)
+
+# Partially update documents (doc id -> changed fields) without re-sending the article text
+def update_fields(updates, index_name=INDEX_NAME, es=None):
+    if not updates:
+        return 0
+    es = es or get_client(BULK)
+    actions = [
         {
-            "_index": INDEX_NAME,
-            "_id": item.get("title"),  # Use the "title" as the document ID to prevent duplicates
-            "_source": item
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": doc_id,
+            "doc": fields
         }
-        for item in data
-        if "title" in item  # Ensure "title" exists in the document
+        for doc_id, fields in updates.items()
     ]
-
-    try:
-        helpers.bulk(es, articles)
-        print(f"Successfully imported {len(articles)} records into '{INDEX_NAME}' index")
-    except helpers.BulkIndexError as e:
-        print(f"Some data is invalid, total {len(e.errors)} errors")
+    success, errors = helpers.bulk(es, actions, raise_on_error=False)
+    if errors:
+        print(f"Failed to update {len(errors)} documents")
+    print(f"Updated {success} documents in '{index_name}' index")
+    return success
 
 if __name__ == "__main__":
     print("Starting data import...")
     wait_for_es()  # Ensure Elasticsearch is running
-    for filename in os.listdir(DATA_FOLDER):
-        if filename.endswith(".json"):
-            file_path = os.path.join(DATA_FOLDER, filename)
-            print(f"Importing data from {file_path}...")
-            import_data(file_path)
+    import_corpus()
     print("Data import completed.")
\ No newline at end of file
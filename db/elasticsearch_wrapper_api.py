@@ -1,16 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-from elasticsearch import Elasticsearch
 import google.generativeai as genai
+import hmac
+import json
 import os
 import time
-from datetime import datetime
-from es_gen_models import genV1, genV2, genV3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from es_gen_models import (
+    genV1, genV2, get_search_settings, parse_keywords, resolve_keywords, run_generation,
+    searchV3, sample_titles, gem_consp, gen_output, SearchError, GEMINI_TIMEOUT_MESSAGE
+)
+from deadline import Deadline
+from es_client import ES_HOSTS, get_client
+from gem_policy import get_stats as get_gemini_stats
+from structured_log import get_logger, start_request, end_request, current_request, submit, count
+from http_cache import (
+    GENERATE_CACHE_MAX_AGE, SAMPLES_CACHE_MAX_AGE, index_version, make_etag, not_modified,
+    set_cache_headers, no_store, compress_response, samples_seed
+)
+from response_cache import (
+    ARTICLE_LIMIT, generations, response_key, cached_search, is_cacheable_generation,
+    stats as response_cache_stats
+)
+from profiling import (
+    PROFILE_TOKEN, PROFILE_MAX_SECONDS, PROFILE_INTERVAL_MS, sample_stacks, collapse,
+    start_slow_request_sampler, dump_if_slow
+)
 import subprocess
 
-# Configure Elasticsearch
-ES_HOST = os.getenv("ES_HOST", "http://elasticsearch:9200")
-print(f"🔌 Will attempt connecting to Elasticsearch at {ES_HOST}")
+log = get_logger("api")
+
+# Configure Elasticsearch (hosts, pool size, timeouts and retries: see es_client.py)
+log.info("🔌 Will attempt connecting to Elasticsearch at %s", ", ".join(ES_HOSTS))
 
 MAX_RETRIES = 10
 RETRY_DELAY = 5  # seconds
@@ -19,38 +40,89 @@ es = None
 connected = False
 for attempt in range(MAX_RETRIES):
     try:
-        es_temp = Elasticsearch([ES_HOST], verify_certs=False)
+        es_temp = get_client()
         if es_temp.ping():
             es = es_temp
             connected = True
-            print(f"✅ Connected to Elasticsearch on attempt {attempt+1}")
+            log.info("✅ Connected to Elasticsearch on attempt %d", attempt + 1)
             break
         else:
-            print(f"Attempt {attempt+1}: Elasticsearch not reachable, retrying in {RETRY_DELAY}s...")
+            log.warning("Attempt %d: Elasticsearch not reachable, retrying in %ss...", attempt + 1, RETRY_DELAY)
     except Exception as e:
-        print(f"⚠️ Elasticsearch error on attempt {attempt+1}: {e}")
+        log.warning("⚠️ Elasticsearch error on attempt %d: %s", attempt + 1, e)
     time.sleep(RETRY_DELAY)
 
 if not connected:
-    print("❌ Gave up connecting to Elasticsearch after multiple retries.")
+    log.error("❌ Gave up connecting to Elasticsearch after multiple retries.")
 else:
-    print("✅ Elasticsearch connection established.")
+    log.info("✅ Elasticsearch connection established.")
 
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 if not GEMINI_API_KEY:
-    print("⚠️ Gemini API key not set. Check .env file.")
+    log.warning("⚠️ Gemini API key not set. Check .env file.")
 else:
     try:
         genai.configure(api_key=GEMINI_API_KEY)
-        print("✅ Gemini API configured successfully")
+        log.info("✅ Gemini API configured successfully")
     except Exception as e:
-        print(f"❌ Gemini API initialization failed: {e}")
+        log.error("❌ Gemini API initialization failed: %s", e)
+
+# Overall time budget for one /generate request (search, Wikipedia fallback and Gemini)
+GENERATE_BUDGET_S = float(os.getenv("GENERATE_BUDGET_S", "30"))
+
+# Upper bounds for the per-request search overrides
+MAX_SEARCH_DEPTH = 4
+MAX_BEAM_WIDTH = 10
+# Exhaustive search fans out over every hit at every level, so its depth is capped lower:
+# a deeper search would only stop at the request deadline, holding a worker for the whole budget
+MAX_EXHAUSTIVE_DEPTH = 2
+
+# /generate/batch limits: queries per batch, concurrent path searches and concurrent Gemini calls
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_SEARCH_WORKERS = int(os.getenv("BATCH_SEARCH_WORKERS", "8"))
+BATCH_GEMINI_CONCURRENCY = int(os.getenv("BATCH_GEMINI_CONCURRENCY", "4"))
+# Gemini is not called for a batch item with less than this much of its budget left after the search
+BATCH_GEMINI_MIN_BUDGET_S = float(os.getenv("BATCH_GEMINI_MIN_BUDGET_S", "3"))
 
 app = Flask(__name__)
 CORS(app)
 
+start_slow_request_sampler()
+app.after_request(compress_response)
+
+# Every request gets a correlation ID (the caller's X-Request-ID if it is a plain token) attached to its log
+# events, and ends with one summary line holding its status, duration and counters.
+@app.before_request
+def begin_request_log():
+    g.log_token = start_request(request.headers.get("X-Request-ID"))
+
+@app.after_request
+def add_request_id(response):
+    context = current_request()
+    if context is not None:
+        context.set(status=response.status_code)
+        response.headers["X-Request-ID"] = context.request_id
+    return response
+
+# Runs after streamed responses have finished, so batch summaries cover the whole stream
+@app.teardown_request
+def finish_request_log(error=None):
+    token = g.pop("log_token", None)
+    context = current_request()
+    if token is None or context is None:
+        return
+    fields = {"event": "request", "method": request.method, "path": request.path}
+    if error is not None:
+        fields.update(status=500, error=str(error))
+    summary = context.summary(**fields)
+    profile_path = dump_if_slow(context, summary)
+    if profile_path:
+        summary["profile"] = profile_path
+    log.info("request", extra=summary)
+    end_request(token)
+
 def check_index_exists(es, index_name="wikipedia"):
     """
     Check if an Elasticsearch index exists
@@ -58,7 +130,7 @@ def check_index_exists(es, index_name="wikipedia"):
     try:
         return es.indices.exists(index=index_name)
     except Exception as e:
-        print(f"❌ Error checking index: {e}")
+        log.error("❌ Error checking index: %s", e)
         return False
 
 def reimport_data():
@@ -66,39 +138,198 @@ def reimport_data():
     Trigger the re-import of data into Elasticsearch
     """
     try:
-        print("🔄 Re-importing Wikipedia data...")
+        log.info("🔄 Re-importing Wikipedia data...")
         subprocess.run(["docker", "compose", "-f", "compose.prod.yml", "run", "--rm", "import-data"], check=True)
-        print("✅ Wikipedia data re-imported successfully.")
+        log.info("✅ Wikipedia data re-imported successfully.")
     except subprocess.CalledProcessError as e:
-        print(f"❌ Import failed: {e}")
+        log.error("❌ Import failed: %s", e)
+
+def parse_bounded_int(params, name, upper):
+    """params[name] clamped to 1..upper, None if absent. JSON bodies may send any type, so only ints and digit strings are accepted."""
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"'{name}' must be an integer")
+    try:
+        return max(1, min(int(value), upper))
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer") from None
+
+def parse_search_settings(params):
+    """
+    Read the optional path search mode ("exhaustive", "fast", "balanced", "thorough")
+    and depth/beam_width overrides from query args or a JSON body. Raises ValueError if invalid.
+    """
+    depth = parse_bounded_int(params, "depth", MAX_SEARCH_DEPTH)
+    beam_width = parse_bounded_int(params, "beam_width", MAX_BEAM_WIDTH)
+    mode = params.get("mode")
+    if mode is not None and not isinstance(mode, str):
+        raise ValueError("'mode' must be a string")
+    search = get_search_settings(mode, depth, beam_width)
+    if search["strategy"] == "exhaustive":
+        search["depth"] = min(search["depth"], MAX_EXHAUSTIVE_DEPTH)
+    return search
+
+def ensure_index():
+    """
+    Check if the 'wikipedia' index exists. If not, re-import the data.
+    Returns an error response if the index is still missing.
+    """
+    if not check_index_exists(es, "wikipedia"):
+        reimport_data()
+        # Verify if the index was successfully created after re-importing
+        if not check_index_exists(es, "wikipedia"):
+            return jsonify({"error": "Failed to create 'wikipedia' index after re-importing data"}), 500
+    return None
 
 # API Endpoints
 @app.route("/generate", methods=["GET"])
 def generate():
     query = request.args.get("q", "").strip()
+    deadline = Deadline(GENERATE_BUDGET_S)
 
     if not query:
         return jsonify({"error": "Missing query"}), 400
 
-    # Check if the 'wikipedia' index exists. If not, re-import the data.
-    if not check_index_exists(es, "wikipedia"):
-        reimport_data()
-        # Verify if the index was successfully created after re-importing
-        if not check_index_exists(es, "wikipedia"):
-            return jsonify({"error": "Failed to create 'wikipedia' index after re-importing data"}), 500
+    try:
+        search = parse_search_settings(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    index_error = ensure_index()
+    if index_error:
+        return index_error
+
+    current_request().set(mode=request.args.get("mode") or "default")
+
+    # Any story for the same keywords and search settings on the same index is a valid cached copy,
+    # whether the client, the proxy or the response cache (see response_cache.py and warm_cache.py) holds it
+    keywords = parse_keywords(query)
+    version, last_modified = index_version(es)
+    etag = response_key(keywords, search, version) if version else None
+    if etag:
+        cached = not_modified(etag, last_modified, GENERATE_CACHE_MAX_AGE)
+        if cached:
+            current_request().set(not_modified=True)
+            return cached
+        generation = generations.get(etag)
+        if generation is not None:
+            response_cache_stats.record("generation")
+            return set_cache_headers(jsonify({**generation, "keywords": keywords}), etag, last_modified, GENERATE_CACHE_MAX_AGE)
+
+    def search_step():
+        wiki_data, from_cache = cached_search(es, connected, keywords, search, etag, deadline)
+        response_cache_stats.record("search" if from_cache else "miss")
+        return wiki_data
+
+    response = app.make_response(run_generation(search_step, GEMINI_API_KEY, keywords, deadline))
+    output = response.get_json(silent=True)
+    if etag and response.status_code == 200 and is_cacheable_generation(output):
+        generations.set(etag, output)
+        return set_cache_headers(response, etag, last_modified, GENERATE_CACHE_MAX_AGE)
+    return no_store(response)
+
+@app.route("/generate/batch", methods=["POST"])
+def generate_batch():
+    """
+    Generate many stories in one request. Body: {"queries": ["a, b", ["c", "d"], ...], "mode": ...}.
+    Keywords are resolved once for the whole batch in chunked _msearch requests, path searches and Gemini
+    calls run on separate bounded pools, and results are streamed back as NDJSON lines
+    ({"index", "status", "result"}) in completion order. A failed or skipped Gemini call has a
+    502/504 status and an "error" in its result.
+    """
+    body = request.get_json(silent=True) or {}
+    queries = body.get("queries")
+
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Missing queries"}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({"error": f"Too many queries, the limit is {BATCH_MAX_QUERIES}"}), 400
+
+    keyword_lists = []
+    for q in queries:
+        if isinstance(q, str):
+            keyword_lists.append(parse_keywords(q))
+        elif isinstance(q, list) and all(isinstance(k, str) for k in q):
+            keyword_lists.append([k.strip() for k in q if k.strip()])
+        else:
+            return jsonify({"error": "Each query must be a comma separated string or a list of keywords"}), 400
+
+    try:
+        search = parse_search_settings(body)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    index_error = ensure_index()
+    if index_error:
+        return index_error
+
+    current_request().set(queries=len(keyword_lists))
+
+    # Every distinct keyword in the batch is looked up exactly once
+    resolved = resolve_keywords(
+        es, connected, [k for keywords in keyword_lists for k in keywords], Deadline(GENERATE_BUDGET_S), ARTICLE_LIMIT
+    )
 
-    obj = genV3(es, connected, GEMINI_API_KEY, query, article_limit=5)
+    def run_search(keywords):
+        deadline = Deadline(GENERATE_BUDGET_S)
+        return searchV3(es, connected, keywords, ARTICLE_LIMIT, deadline, search, resolved), deadline.remaining()
 
-    # obj = genV1(es, connected, GEMINI_API_KEY, query)
+    def run_gemini(keywords, wiki_data, budget):
+        """
+        Returns (status, result). Items wait for a free slot of gemini_pool, so the Gemini stage gets
+        what the search left of the budget from the moment the call starts, not from the search.
+        """
+        if budget < BATCH_GEMINI_MIN_BUDGET_S:
+            count("gemini_skipped")
+            return 504, {"error": "Not enough time left for Gemini after the search"}
+        output = gen_output(keywords, gem_consp(GEMINI_API_KEY, keywords, wiki_data, deadline=Deadline(budget)), wiki_data)
+        if is_cacheable_generation(output):
+            return 200, output
+        error = output["generated_conspiracy"]
+        return (504 if error == GEMINI_TIMEOUT_MESSAGE else 502), {**output, "error": error}
 
-    return obj
+    def stream():
+        with ThreadPoolExecutor(max_workers=BATCH_SEARCH_WORKERS) as search_pool, \
+                ThreadPoolExecutor(max_workers=BATCH_GEMINI_CONCURRENCY) as gemini_pool:
+            pending = {}  # future -> (stage, query index)
+            for i, keywords in enumerate(keyword_lists):
+                pending[submit(search_pool, run_search, keywords)] = ("search", i)
+
+            try:
+                while pending:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, i = pending.pop(future)
+                        keywords = keyword_lists[i]
+                        try:
+                            if stage == "search":
+                                wiki_data, budget = future.result()
+                                pending[submit(gemini_pool, run_gemini, keywords, wiki_data, budget)] = ("gemini", i)
+                                continue
+                            status, result = future.result()
+                            line = {"index": i, "status": status, "result": result}
+                        except SearchError as e:
+                            line = {"index": i, "status": e.status, "result": {"error": e.message}}
+                        except Exception as e:
+                            line = {"index": i, "status": 500, "result": {"error": str(e)}}
+                        yield json.dumps(line) + "\n"
+            except GeneratorExit:
+                # The client went away: drop the queued work instead of finishing the whole batch
+                search_pool.shutdown(wait=False, cancel_futures=True)
+                gemini_pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    # Disable proxy buffering so every line reaches the client as soon as it is ready
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
 
 @app.route("/samples", methods=["GET"])
 def getSamples():
     numTopics = 50  # Default number of topics to fetch
 
     if not es or not connected:
-        print("❌ Elasticsearch is not connected.")
+        log.warning("❌ Elasticsearch is not connected.")
         return jsonify({"error": "Elasticsearch is not connected"}), 500
 
     # Check if the 'wikipedia' index exists. If not, re-import the data.
@@ -108,38 +339,52 @@ def getSamples():
         if not check_index_exists(es, "wikipedia"):
             return jsonify({"error": "Failed to create 'wikipedia' index after re-importing data"}), 500
 
-    try:
-        seed = int(datetime.now().strftime("%H%M%S"))  # Use current time as seed
-    except ValueError as e:
-        print(f"⚠️ Error generating seed from datetime: {e}")
-        seed = 0  # Fallback to a default seed value
+    seed = samples_seed()
+    version, last_modified = index_version(es)
+    etag = make_etag("samples", seed, version) if version else None
+    if etag:
+        cached = not_modified(etag, last_modified, SAMPLES_CACHE_MAX_AGE)
+        if cached:
+            return cached
 
     try:
-        response = es.search(
-            index="wikipedia",
-            body={
-                "size": numTopics,
-                "_source": ["title"],
-                "query": {
-                    "function_score": {
-                        "query": {"match_all": {}},
-                        "random_score": {"seed": seed, "field": "_seq_no"}
-                    }
-                }
-            }
-        )
-        
-        samples = [hit["_source"]["title"] for hit in response["hits"]["hits"]]
+        samples = sample_titles(es, seed, numTopics)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch samples: {str(e)}"}), 500
 
+    if etag:
+        return set_cache_headers(jsonify(samples), etag, last_modified, SAMPLES_CACHE_MAX_AGE)
     return jsonify(samples)
 
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    """
+    Samples every thread's stack for `seconds` (default 10) and returns them as collapsed
+    stacks (text/plain), ready for flamegraph.pl or speedscope. Needs the PROFILE_TOKEN
+    in the X-Profile-Token header; disabled when no token is configured.
+    """
+    if not PROFILE_TOKEN:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    # Constant time comparison, so response timing does not leak how much of a guess matched
+    if not hmac.compare_digest(request.headers.get("X-Profile-Token", "").encode(), PROFILE_TOKEN.encode()):
+        return jsonify({"error": "Invalid profile token"}), 403
+
+    try:
+        seconds = min(float(request.args.get("seconds", 10)), PROFILE_MAX_SECONDS)
+        interval_ms = max(1.0, float(request.args.get("interval_ms", PROFILE_INTERVAL_MS)))
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+
+    counts = sample_stacks(seconds, interval_ms)
+    if counts is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    return Response(collapse(counts), mimetype="text/plain")
+
 @app.route("/debug/status", methods=["GET"])
 def debug_status():
     status = {
         "elasticsearch": {
-            "host": ES_HOST, 
+            "hosts": ES_HOSTS,
             "connected": False, 
             "error": None, 
             "index_exists": False
@@ -147,8 +392,10 @@ def debug_status():
         "gemini_api": {
             "configured": bool(GEMINI_API_KEY), 
             "error": None, 
-            "model_initialized": False
+            "model_initialized": False,
+            "call_stats": get_gemini_stats()
         },
+        "response_cache": response_cache_stats.snapshot(),
         "app_info": {
             "flask_debug": app.debug, 
             "port": 5002
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from elasticsearch import Elasticsearch
+
+
+def _hosts(value: str) -> list:
+    return [host.strip() for host in value.split(",") if host.strip()]
+
+
+# Comma separated nodes serving searches. A single ES_HOST is still accepted.
+ES_HOSTS = _hosts(os.getenv("ES_HOSTS") or os.getenv("ES_HOST") or "http://elasticsearch:9200")
+# Nodes bulk imports, reindexing and snapshots are sent to, so heavy indexing can be kept
+# off the nodes serving the API. Defaults to ES_HOSTS.
+ES_BULK_HOSTS = _hosts(os.getenv("ES_BULK_HOSTS", "")) or ES_HOSTS
+# Discover the rest of the cluster from the configured nodes, at start and after a node fails.
+# Sniffed nodes are reached by their publish address, which must be reachable from the container.
+ES_SNIFF = os.getenv("ES_SNIFF", "0") == "1"
+ES_SNIFF_INTERVAL_S = float(os.getenv("ES_SNIFF_INTERVAL_S", "60"))
+# Connections kept per node. Should cover the API's concurrent ES requests: request threads
+# plus PAIR_SEARCH_WORKERS and BATCH_SEARCH_WORKERS.
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "32"))
+# Default timeouts; searches on the request path pass shorter ones with es.options(request_timeout=...)
+ES_REQUEST_TIMEOUT_S = float(os.getenv("ES_REQUEST_TIMEOUT_S", "10"))
+ES_BULK_TIMEOUT_S = float(os.getenv("ES_BULK_TIMEOUT_S", "120"))
+# Retries on another node after connection errors and 429/502/503/504 responses. Timed out
+# reads are not retried, the request budget is already spent; timed out bulk requests are.
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "2"))
+# Replicas of the wikipedia index once it is built or restored, 0 on a single node
+ES_REPLICAS = int(os.getenv("ES_REPLICAS", "0"))
+ES_VERIFY_CERTS = os.getenv("ES_VERIFY_CERTS", "0") == "1"
+# How long the metadata of the live index (see index_info) is reused before asking Elasticsearch again
+INDEX_INFO_TTL_S = 30
+
+READ = "read"
+BULK = "bulk"
+
+
+def create_client(purpose: str = READ) -> Elasticsearch:
+    """A new client for serving reads (READ) or for bulk imports and index maintenance (BULK)."""
+    bulk = purpose == BULK
+    return Elasticsearch(
+        ES_BULK_HOSTS if bulk else ES_HOSTS,
+        connections_per_node=ES_CONNECTIONS_PER_NODE,
+        request_timeout=ES_BULK_TIMEOUT_S if bulk else ES_REQUEST_TIMEOUT_S,
+        max_retries=ES_MAX_RETRIES,
+        retry_on_timeout=bulk,
+        sniff_on_start=ES_SNIFF,
+        sniff_on_node_failure=ES_SNIFF,
+        min_delay_between_sniffing=ES_SNIFF_INTERVAL_S,
+        verify_certs=ES_VERIFY_CERTS,
+    )
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(purpose: str = READ) -> Elasticsearch:
+    """The process wide client for a purpose. Clients are thread safe and pool their connections."""
+    with _clients_lock:
+        if purpose not in _clients:
+            _clients[purpose] = create_client(purpose)
+        return _clients[purpose]
+
+
+def read_index_info(es, index: str) -> dict:
+    """
+    Name, UUID, creation time (epoch ms) and mapping version of the newest concrete index behind
+    `index`, an alias or an index. Indices from before mapping versions are version 1.
+    """
+    indices = es.indices.get(
+        index=index, filter_path="*.settings.index.uuid,*.settings.index.creation_date,*.mappings._meta"
+    )
+    name = sorted(indices)[-1]
+    body = indices[name]
+    settings = body["settings"]["index"]
+    return {
+        "name": name,
+        "uuid": settings["uuid"],
+        "created_ms": int(settings["creation_date"]),
+        "mapping_version": int(body.get("mappings", {}).get("_meta", {}).get("mapping_version", 1)),
+    }
+
+
+def mapping_version(es, index: str) -> int:
+    return read_index_info(es, index)["mapping_version"]
+
+
+_index_info = {}  # index -> (info, looked up at)
+_index_info_lock = threading.Lock()
+
+
+def index_info(es, index: str = "wikipedia") -> dict:
+    """read_index_info of the index serving requests, reused for INDEX_INFO_TTL_S. Raises if Elasticsearch fails."""
+    with _index_info_lock:
+        cached = _index_info.get(index)
+    if cached is not None and time.monotonic() - cached[1] < INDEX_INFO_TTL_S:
+        return cached[0]
+    info = read_index_info(es, index)
+    with _index_info_lock:
+        _index_info[index] = (info, time.monotonic())
+    return info
@@ -1,38 +1,139 @@
 from elasticsearch import Elasticsearch
-from elasticsearch import helpers
 from flask import jsonify
-import google.generativeai as genai
+from gem_policy import GemPolicy, GeminiTimeout, hedged_generate
+from deadline import Deadline
+from es_client import index_info
+from wiki_write_behind import get_write_behind
+from ttl_cache import TTLCache, CACHE_DIR
+from related_index import get_related_index
+from structured_log import get_logger, count, timing, current_request, submit
+from profiling import record_es_query
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+import os
 import requests
 from requests.utils import quote
+import time
+
+log = get_logger("search")
+
+# Timeout for the Wikipedia summary API fallback
+WIKI_API_TIMEOUT = 10
+# Skip the Wikipedia fallback when less than this much of the request budget is left
+WIKI_FALLBACK_MIN_BUDGET = 3.0
+# Upper bound for a single Elasticsearch search
+ES_REQUEST_TIMEOUT = 10
+# Searches per _msearch request (see call_es_multi)
+MSEARCH_CHUNK_SIZE = int(os.getenv("MSEARCH_CHUNK_SIZE", "10"))
+
+# Negative cache of topics with no usable Wikipedia content (normalized topic -> miss reason).
+# Shared by every API worker through a small SQLite file; known misses skip the Wikipedia API fallback.
+NEGATIVE_CACHE_TTL_S = float(os.getenv("NEGATIVE_CACHE_TTL_S", str(24 * 60 * 60)))
+NEGATIVE_CACHE_MAX_SIZE = int(os.getenv("NEGATIVE_CACHE_MAX_SIZE", "50000"))
+NEGATIVE_CACHE_PATH = os.getenv("NEGATIVE_CACHE_PATH", os.path.join(CACHE_DIR, "wiki_negative.sqlite"))
+negative_cache = TTLCache(NEGATIVE_CACHE_PATH, "wiki_misses", NEGATIVE_CACHE_TTL_S, NEGATIVE_CACHE_MAX_SIZE)
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.lower().split())
+
+# Returns the cached miss reason for a topic, or None if it is not a known miss
+def known_miss(topic: str):
+    return negative_cache.get(normalize_topic(topic))
+
+
+def get_daily_views(doc) -> int:
+    views = doc.get('daily_views', 0)
+    return views if isinstance(views, int) and views > 0 else 0
+
+# Fields fetched for path search candidates; the full article is only fetched for the final chain (see hydrate)
+CANDIDATE_SOURCE = ["title", "daily_views"]
+# Fields of an article a generation reads: the prompt, the listed sources and the views ranking
+DOCUMENT_SOURCE = ["title", "wikipedia_content", "source_url", "daily_views"]
+# Mapping v2 indices (see elasticsearch_import.py) store the title and keep daily_views in doc values,
+# so candidate searches there skip loading _source altogether
+CANDIDATE_FIELDS_V2 = {"_source": False, "stored_fields": ["title"], "docvalue_fields": ["daily_views"]}
+def candidate_fields(es: Elasticsearch) -> dict:
+    """search() arguments that fetch only the candidate fields, for the mapping of the live index."""
+    try:
+        version = index_info(es)["mapping_version"]
+    except Exception as e:
+        log.warning("⚠️ Could not read the index mapping version: %s", e)
+        version = 1
+    return CANDIDATE_FIELDS_V2 if version >= 2 else {"_source": CANDIDATE_SOURCE}
+# Hydration runs even when the request budget is spent, since the chain is useless without its articles
+HYDRATE_MIN_TIMEOUT = 2.0
 
-
-# Cleans duplicate hits from Elasticsearch results based on the title field
+class Candidate:
+    """
+    Compact record of an article considered by the path searches: its ES _id, title,
+    daily views and relevance score. `doc` holds the full source once it is known.
+    """
+    __slots__ = ("id", "title", "views", "score", "doc")
+
+    def __init__(self, id: str, title: str, views: int = 0, score: float = 0.0, doc: dict = None):
+        self.id = id
+        self.title = title
+        self.views = views
+        self.score = score
+        self.doc = doc
+
+    @classmethod
+    def from_hit(cls, hit: dict):
+        fields = hit.get("fields")
+        if fields is not None and "title" in fields:
+            # Stored fields and doc values are lists (see CANDIDATE_FIELDS_V2)
+            views = fields.get("daily_views", [0])[0]
+            return cls(hit["_id"], fields["title"][0], views if views > 0 else 0, hit.get("_score") or 0.0)
+        source = hit["_source"]
+        return cls(hit["_id"], source["title"], get_daily_views(source), hit.get("_score") or 0.0)
+
+    @classmethod
+    def from_doc(cls, doc: dict, score: float = 0.0):
+        # Documents are indexed by title (see elasticsearch_import.py and wiki_write_behind.py)
+        return cls(doc["title"], doc["title"], get_daily_views(doc), score, doc)
+
+    def __repr__(self):
+        return f"Candidate({self.title!r}, views={self.views}, score={self.score:.2f})"
+
+
+# Cleans duplicate hits (documents or Candidates) from Elasticsearch results based on the title
 def clean_duplicate_hits(hits):
-    unique_hit_titles = []
+    unique_hit_titles = set()
     unique_hits = []
 
     for hit in hits:
-        title = hit['title']
+        title = hit.title if isinstance(hit, Candidate) else hit['title']
         if title not in unique_hit_titles:
-            unique_hit_titles.append(title)
+            unique_hit_titles.add(title)
             unique_hits.append(hit)
 
-    print(f"Cleaned {len(hits) - len(unique_hits)} duplicate hits")
+    log.debug("Cleaned %d duplicate hits", len(hits) - len(unique_hits))
     return unique_hits
 
 # Fetch from Wikipedia API Method
-def fetch_from_wiki_api(es: Elasticsearch, connected: bool, topic: str) -> list:
+# Found documents are upserted into ES by the background write-behind queue. Until ES has
+# refreshed, repeat lookups of the topic are answered from the queue's in-memory map.
+def fetch_from_wiki_api(es: Elasticsearch, connected: bool, topic: str, timeout: float = WIKI_API_TIMEOUT) -> list:
     if not es or not connected:
-        print("❌ Failed Wiki Fetch, Elasticsearch is not connected.")
+        log.warning("❌ Failed Wiki Fetch, Elasticsearch is not connected.")
         return None
 
-    print(f"🔍 Fetching from Wikipedia API for topic: {topic}")
-    
+    write_behind = get_write_behind()
+    recent = write_behind.get_recent(topic.lower())
+    if recent is not None:
+        log.debug("✅ Recently fetched from Wikipedia API: %s", topic)
+        return recent
+
+    log.debug("🔍 Fetching from Wikipedia API for topic: %s", topic)
+    count("wiki_fetches")
+    start = time.monotonic()
     try:
         WIKI_API_URL = "https://en.wikipedia.org/api/rest_v1/page/summary/"
         # Use URL encoding for the topic
         url = WIKI_API_URL + quote(topic)
-        response = requests.get(url, timeout=10)
+        response = requests.get(url, timeout=timeout)
+        timing("wiki", time.monotonic() - start)
 
         if response.status_code == 200:
             wiki_data = response.json()
@@ -40,7 +141,8 @@ def fetch_from_wiki_api(es: Elasticsearch, connected: bool, topic: str) -> list:
             t = wiki_data.get("type", "ambiguous")
 
             if t != "standard" or content == "No content available." or content == "":
-                print(f"⚠️ Wikipedia returned 'No content available' for: {topic}")
+                log.debug("⚠️ Wikipedia returned 'No content available' for: %s", topic)
+                negative_cache.set(normalize_topic(topic), "non_standard" if t != "standard" else "empty")
                 return None
             page_url = wiki_data.get("content_urls", {}).get("desktop", {}).get("page", "")
             doc = {
@@ -49,55 +151,134 @@ def fetch_from_wiki_api(es: Elasticsearch, connected: bool, topic: str) -> list:
                 "wikipedia_content": content,
                 "source_url": page_url
             }
-            action = {
-                "_op_type": "update",
-                "_index": "wikipedia",
-                "_id": doc["title"],
-                "doc": doc,
-                "doc_as_upsert": True
-            }
-            helpers.bulk(es, [action])
-            print(f"✅ Wiki API Found Data for: {topic}")
-            print(doc['wikipedia_content'])
+            write_behind.put(doc["title"], doc)
+            log.debug("✅ Wiki API Found Data for: %s", topic)
             return doc
         else:
-            print(f"⚠️ Wikipedia API returned status code {response.status_code} for topic: {topic}")
+            log.warning("⚠️ Wikipedia API returned status code %d for topic: %s", response.status_code, topic)
+            # Only a missing page is a definite miss, rate limits and server errors are retried next time
+            if response.status_code == 404:
+                negative_cache.set(normalize_topic(topic), "not_found")
             return None
     except Exception as e:
-        print(f"❌ Error fetching from Wikipedia API: {e}")
+        log.error("❌ Error fetching from Wikipedia API: %s", e)
         return None
 
 # Function to call Elasticsearch and return results for a given query
-def call_es(es: Elasticsearch, connected: bool, topic: str, es_query: dict):
+# The deadline shrinks the result size and skips the Wikipedia fallback as the request budget runs out
+# With candidates=True only the candidate fields are fetched and the hits are returned as Candidates
+def call_es(es: Elasticsearch, connected: bool, topic: str, es_query: dict, deadline: Deadline = None, candidates: bool = False):
+    deadline = deadline or Deadline()
     try:
         if not es or not connected:
-            print("❌ Elasticsearch is not connected.")
+            log.warning("❌ Elasticsearch is not connected.")
+            return None
+
+        if deadline.expired():
+            log.debug("⏱️ Request budget exhausted, skipping search for: %s", topic)
             return None
 
         if not es.indices.exists(index="wikipedia"):
-            print(f"❌ Index 'wikipedia' does not exist")
+            log.error("❌ Index 'wikipedia' does not exist")
             return None
-            
-        response = es.search(index="wikipedia", query=es_query["query"], size=es_query.get("size", 10))
-        hits = response.get("hits", {}).get("hits", [])
 
-        # Call Wikipedia API if no hits are found
-        if not hits:
-            print(f"⚠️ No Wikipedia data found for elastic search query: {topic}")
-            hit = fetch_from_wiki_api(es, connected, topic)
+        size = deadline.scale(es_query.get("size", 10), minimum=5)
+        fields = candidate_fields(es) if candidates else {}
+        record_es_query("search", {"query": es_query["query"], "size": size, **fields})
+        count("es_calls")
+        start = time.monotonic()
+        response = es.options(request_timeout=deadline.clamp(ES_REQUEST_TIMEOUT)).search(
+            index="wikipedia", query=es_query["query"], size=size, **fields
+        )
+        timing("es", time.monotonic() - start)
+        hits = response.get("hits", {}).get("hits", [])
+        return handle_es_hits(es, connected, topic, hits, deadline, candidates)
+    except Exception as e:
+        log.error("❌ Elasticsearch error: %s", e)
+        count("es_errors")
+        return None
 
-            if hit is None:
-                return None
-            return [hit]
+# Batched call_es: runs one query per topic in _msearch round trips of up to MSEARCH_CHUNK_SIZE
+# searches, so a large batch never waits on one huge response and a failed chunk only fails its topics.
+# Returns a list with the hits (or None) for each topic, in order.
+def call_es_multi(es: Elasticsearch, connected: bool, topics: list, es_queries: list, deadline: Deadline = None):
+    deadline = deadline or Deadline()
+    results = [None] * len(topics)
+    try:
+        if not es or not connected:
+            log.warning("❌ Elasticsearch is not connected.")
+            return results
 
-        print(f"✅ Found {len(hits)} results for {topic}")
-        for hit in hits:
-            print(f" - {hit['_source']['title']}")
+        if deadline.expired():
+            log.debug("⏱️ Request budget exhausted, skipping search for: %s", topics)
+            return results
 
-        return [hit["_source"] for hit in hits]
+        if not es.indices.exists(index="wikipedia"):
+            log.error("❌ Index 'wikipedia' does not exist")
+            return results
     except Exception as e:
-        print(f"❌ Elasticsearch error: {e}")
-        return None
+        log.error("❌ Elasticsearch error: %s", e)
+        count("es_errors")
+        return results
+
+    for chunk_start in range(0, len(topics), MSEARCH_CHUNK_SIZE):
+        chunk = range(chunk_start, min(chunk_start + MSEARCH_CHUNK_SIZE, len(topics)))
+        if deadline.expired():
+            log.debug("⏱️ Request budget exhausted, skipping search for: %s", [topics[i] for i in chunk])
+            break
+        searches = []
+        for i in chunk:
+            es_query = es_queries[i]
+            searches.append({"index": "wikipedia"})
+            searches.append({
+                "query": es_query["query"],
+                "size": deadline.scale(es_query.get("size", 10), minimum=5),
+                **({"_source": es_query["_source"]} if "_source" in es_query else {}),
+            })
+        try:
+            record_es_query("msearch", searches)
+            count("es_calls")
+            start = time.monotonic()
+            response = es.options(request_timeout=deadline.clamp(ES_REQUEST_TIMEOUT)).msearch(searches=searches)
+            timing("es", time.monotonic() - start)
+
+            for i, item in zip(chunk, response.get("responses", [])):
+                topic = topics[i]
+                if "error" in item:
+                    log.error("❌ Elasticsearch error for %s: %s", topic, item['error'])
+                    continue
+                hits = item.get("hits", {}).get("hits", [])
+                results[i] = handle_es_hits(es, connected, topic, hits, deadline)
+        except Exception as e:
+            log.error("❌ Elasticsearch error: %s", e)
+            count("es_errors")
+    return results
+
+# Turns raw ES hits into source documents (or Candidates), calling the Wikipedia API if there are none
+def handle_es_hits(es: Elasticsearch, connected: bool, topic: str, hits: list, deadline: Deadline, candidates: bool = False):
+    if not hits:
+        log.debug("⚠️ No Wikipedia data found for elastic search query: %s", topic)
+        if deadline.remaining() < WIKI_FALLBACK_MIN_BUDGET:
+            log.debug("⏱️ Not enough budget left for the Wikipedia fallback: %s", topic)
+            return None
+        # Only the Wikipedia fallback is skipped, a later import may still have added the topic to ES
+        miss = known_miss(topic)
+        if miss:
+            log.debug("⚠️ Known miss (%s), skipping the Wikipedia fallback for: %s", miss, topic)
+            count("known_misses")
+            return None
+        hit = fetch_from_wiki_api(es, connected, topic, timeout=deadline.clamp(WIKI_API_TIMEOUT))
+
+        if hit is None:
+            return None
+        return [Candidate.from_doc(hit)] if candidates else [hit]
+
+    # Candidate hits of a v2 index carry their title in `fields`, not `_source`
+    results = [Candidate.from_hit(hit) for hit in hits] if candidates else [hit["_source"] for hit in hits]
+    if log.isEnabledFor(logging.DEBUG):
+        titles = [result.title if candidates else result["title"] for result in results]
+        log.debug("✅ Found %d results for %s: %s", len(hits), topic, titles)
+    return results
 
 
 ## Elasticsearch Models
@@ -132,23 +313,35 @@ def create_span_near_query(topic: str, field: str, fuzz: int = 2) -> dict:
         span_dict["span_near"]["clauses"].append(span_clause)
     return span_dict
 
+# Ranks an article whose whole title is the topic above fuzzy matches. Uses the title.lower keyword
+# of mapping v2 (see elasticsearch_import.py) and matches nothing on older indices.
+EXACT_TITLE_BOOST = 10
+
+def create_exact_title_clause(topic: str) -> dict:
+    return {"term": {"title.lower": {"value": normalize_topic(topic), "boost": EXACT_TITLE_BOOST}}}
+
+# The should clauses of a keyword lookup in one field
+def create_field_clauses(topic: str, field: str, fuzz: int) -> list:
+    clauses = [create_span_near_query(topic, field, fuzz)]
+    if field == "title":
+        clauses.append(create_exact_title_clause(topic))
+    return clauses
+
 # Searches for a topic in Elasticsearch. If no results are found, tries to fetch from the Wikipedia API.
-def esField(es: Elasticsearch, connected: bool, topic: str, field: str, fuzz=1) -> str:
-    print(f"🔍 Searching for: {topic} in field: {field}")
-    
-    # First try direct term query to see if the exact term exists
+def esField(es: Elasticsearch, connected: bool, topic: str, field: str, fuzz=1, deadline: Deadline = None) -> str:
+    log.debug("🔍 Searching for: %s in field: %s", topic, field)
+
+    # An exact title match ranks first, fuzzy matches of the words follow
     es_query = {
         "query": {
             "bool": {
-                "should": [
-                    create_span_near_query(topic, field, fuzz),
-                ]
+                "should": create_field_clauses(topic, field, fuzz)
             }
         },
         "size": 50
     }
     
-    hits = call_es(es, connected, topic, es_query)
+    hits = call_es(es, connected, topic, es_query, deadline)
     
     if hits is not None:
         hits = clean_duplicate_hits(hits)
@@ -156,10 +349,29 @@ def esField(es: Elasticsearch, connected: bool, topic: str, field: str, fuzz=1)
 
     return None
 
+# Batched esField: looks up every topic with _msearch requests (see call_es_multi)
+def esFieldMulti(es: Elasticsearch, connected: bool, topics: list, field: str, fuzz=1, deadline: Deadline = None, size: int = 50) -> list:
+    log.debug("🔍 Searching for: %s in field: %s", topics, field)
+    es_queries = [
+        {
+            "query": {
+                "bool": {
+                    "should": create_field_clauses(topic, field, fuzz)
+                }
+            },
+            "size": size,
+            "_source": DOCUMENT_SOURCE
+        }
+        for topic in topics
+    ]
+
+    results = call_es_multi(es, connected, topics, es_queries, deadline)
+    return [clean_duplicate_hits(hits) if hits is not None else None for hits in results]
+
 # Takes a connection to ES with every function call.
 # Searches for one topic in Elasticsearch.
-def esV1(es: Elasticsearch, connected: bool, topic: str, fuzz: int = 2) -> str:
-    print(f"🔍 Searching for: {topic}")
+def esV1(es: Elasticsearch, connected: bool, topic: str, fuzz: int = 2, deadline: Deadline = None) -> str:
+    log.debug("🔍 Searching for: %s", topic)
     es_query = {
         "query": {
             "bool": {
@@ -171,7 +383,7 @@ def esV1(es: Elasticsearch, connected: bool, topic: str, fuzz: int = 2) -> str:
         },
         "size": 50
     }
-    hits = call_es(es, connected, topic, es_query)
+    hits = call_es(es, connected, topic, es_query, deadline)
     if hits is not None:
         hits = clean_duplicate_hits(hits)
         return hits
@@ -179,11 +391,11 @@ def esV1(es: Elasticsearch, connected: bool, topic: str, fuzz: int = 2) -> str:
 
 # Uses a relaxed matching logic to search for Wikipedia data in ES,
 # aiming to return documents that contain either topic1, topic2, or both.
-def esV2(es: Elasticsearch, connected: bool, topic1: str, topic2: str, fuzz: int = 1) -> str:
+def esV2(es: Elasticsearch, connected: bool, topic1: str, topic2: str, fuzz: int = 1, deadline: Deadline = None, candidates: bool = False) -> str:
     """
     Search Wikipedia data in Elasticsearch
     """
-    print(f"🔍 Searching for topic between: {topic1} and {topic2}")
+    log.debug("🔍 Searching for topic between: %s and %s", topic1, topic2)
     es_query = {
         "query": {
             "bool": {
@@ -207,7 +419,7 @@ def esV2(es: Elasticsearch, connected: bool, topic1: str, topic2: str, fuzz: int
     }
     
     # is none if ES is not connected or index does not exist
-    hits = call_es(es, connected, topic1 + " and " + topic2, es_query)
+    hits = call_es(es, connected, topic1 + " and " + topic2, es_query, deadline, candidates)
 
     if hits is not None:
         hits = clean_duplicate_hits(hits)
@@ -216,6 +428,100 @@ def esV2(es: Elasticsearch, connected: bool, topic1: str, topic2: str, fuzz: int
         return hits
     return None
 
+# Bridge articles between two topics from the offline related article index (see related_index.py),
+# with the documents (or Candidates) fetched in one mget by title. Returns None when the index is not
+# built or does not contain both topics, so callers can fall back to the esV2 text search.
+USE_RELATED_INDEX = os.getenv("USE_RELATED_INDEX", "1") == "1"
+RELATED_BRIDGE_LIMIT = 10
+
+def related_bridges(es: Elasticsearch, connected: bool, topic1: str, topic2: str, deadline: Deadline = None, candidates: bool = False):
+    deadline = deadline or Deadline()
+    index = get_related_index() if USE_RELATED_INDEX else None
+    if index is None or not es or not connected or deadline.expired():
+        return None
+
+    bridges = index.bridges(topic1, topic2, RELATED_BRIDGE_LIMIT)
+    if not bridges:
+        return None
+
+    count("related_lookups")
+    source = CANDIDATE_SOURCE if candidates else None
+    record_es_query("mget", {"ids": [title for title, _ in bridges], "_source": source})
+    count("es_calls")
+    start = time.monotonic()
+    try:
+        response = es.options(request_timeout=deadline.clamp(ES_REQUEST_TIMEOUT)).mget(
+            index="wikipedia", ids=[title for title, _ in bridges], _source=source
+        )
+    except Exception as e:
+        log.error("❌ Elasticsearch error: %s", e)
+        count("es_errors")
+        return None
+    timing("es", time.monotonic() - start)
+
+    hits = []
+    for (title, score), doc in zip(bridges, response.get("docs", [])):
+        if doc.get("found"):
+            hits.append(Candidate(doc["_id"], doc["_source"]["title"], get_daily_views(doc["_source"]), score)
+                        if candidates else doc["_source"])
+    if not hits:
+        return None
+    log.debug("✅ Found %d related articles between %s and %s", len(hits), topic1, topic2)
+    return hits
+
+# Bridge Candidates between two topics: the related article index when it has both topics, esV2 otherwise
+def bridge_hits(es: Elasticsearch, connected: bool, topic1: str, topic2: str, deadline: Deadline = None):
+    hits = related_bridges(es, connected, topic1, topic2, deadline, candidates=True)
+    if hits is not None:
+        return hits
+    return esV2(es, connected, topic1, topic2, deadline=deadline, candidates=True)
+
+# Full documents of Candidates, in order, fetched in one mget for those without one.
+# Candidates whose document can not be fetched are left out.
+def hydrate(es: Elasticsearch, connected: bool, candidates: list, deadline: Deadline = None) -> list:
+    deadline = deadline or Deadline()
+    ids = [c.id for c in candidates if c.doc is None]
+    docs = {}
+    if ids and es and connected:
+        record_es_query("mget", {"ids": ids})
+        count("es_calls")
+        start = time.monotonic()
+        try:
+            response = es.options(request_timeout=max(HYDRATE_MIN_TIMEOUT, deadline.clamp(ES_REQUEST_TIMEOUT))).mget(
+                index="wikipedia", ids=ids
+            )
+            docs = {doc["_id"]: doc["_source"] for doc in response.get("docs", []) if doc.get("found")}
+        except Exception as e:
+            log.error("❌ Elasticsearch error: %s", e)
+            count("es_errors")
+        timing("es", time.monotonic() - start)
+
+    hydrated = []
+    for c in candidates:
+        doc = c.doc if c.doc is not None else docs.get(c.id)
+        if doc is None:
+            log.warning("⚠️ Could not fetch article: %s", c.title)
+            continue
+        hydrated.append(doc)
+    return hydrated
+
+# Random article titles for /samples, the same for the same seed
+def sample_titles(es: Elasticsearch, seed: int, size: int = 50) -> list:
+    response = es.search(
+        index="wikipedia",
+        body={
+            "size": size,
+            "_source": ["title"],
+            "query": {
+                "function_score": {
+                    "query": {"match_all": {}},
+                    "random_score": {"seed": seed, "field": "_seq_no"}
+                }
+            }
+        }
+    )
+    return [hit["_source"]["title"] for hit in response["hits"]["hits"]]
+
 ## Gemini Prompts
 def consp_promptV1(keywords, wiki_data) -> str:
     prompt = f"""
@@ -231,7 +537,13 @@ def consp_promptV1(keywords, wiki_data) -> str:
     return prompt
 
 # Utilize Tree of Thoughts Prompting 
-def consp_promptV2(keywords, wiki_data) -> str:
+# content_limit truncates each summary, used for the shorter fallback prompt
+def consp_promptV2(keywords, wiki_data, content_limit=None) -> str:
+    # With more than two keywords, the story has to pass through the middle ones in order
+    chain_rule = ""
+    if len(keywords) > 2:
+        chain_rule = f"\n    10. The conspiracy must connect every keyword in this order: {' -> '.join(keywords)}."
+
     prompt = f"""
     Imagine there are five experts on creating concise conspiracy theories. They all sit in a room, 
     collaborating on a response to this prompt. They each write a draft of their thinking based on 
@@ -256,183 +568,408 @@ def consp_promptV2(keywords, wiki_data) -> str:
     6. The conspiracy must be non-falsifiable and open to interpretation.
     7. The conspiracy must cite statistics found in a wikipedia summary at least once
     8. The conspiracy must have a timeline of events
-    9. Sentences should not be run-on.
+    9. Sentences should not be run-on.{chain_rule}
 
     Wikipedia Summaries:
     """
 
     for data in wiki_data:
-        prompt += f"\n- **{data['title']}**: {data.get('wikipedia_content', 'Content not available')}\n"
+        content = data.get('wikipedia_content', 'Content not available')
+        if content_limit and len(content) > content_limit:
+            content = content[:content_limit].rsplit(" ", 1)[0] + "..."
+        prompt += f"\n- **{data['title']}**: {content}\n"
 
     return prompt
 
 
-def gem_consp(GEMINI_API_KEY, keywords, wiki_data):
+# Default call policy, configured through GEMINI_* environment variables
+GEMINI_POLICY = GemPolicy.from_env()
+
+GEMINI_TIMEOUT_MESSAGE = "Error: Gemini took too long to respond. Please try again later."
+
+def gem_consp(GEMINI_API_KEY, keywords, wiki_data, policy: GemPolicy = None, deadline: Deadline = None):
     """
     Use Gemini AI to generate a conspiracy theory.
+    The call is bounded by the policy deadline (and whatever is left of the request deadline),
+    with optional hedging and a cheaper fallback model.
     """
     if not GEMINI_API_KEY:
         return "Error: Gemini API key is not set."
 
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-    except Exception as e:
-        print(f"❌ Error initializing Gemini model: {e}")
-        # Return a user-friendly error message
-        return "Error: Failed to initialize Gemini model. Please try again later (60 seconds)."
-
+    deadline = deadline or Deadline()
+    if deadline.expired():
+        return GEMINI_TIMEOUT_MESSAGE
 
+    policy = policy or GEMINI_POLICY
     prompt = consp_promptV2(keywords, wiki_data)
+    short_prompt = consp_promptV2(keywords, wiki_data, content_limit=policy.short_prompt_chars)
 
-
+    count("gemini_calls")
+    start = time.monotonic()
     try:
-        response = model.generate_content(prompt)
-        return response.text if hasattr(response, 'text') else "Error: Invalid response format."
+        return hedged_generate(policy, prompt, short_prompt, deadline=deadline.remaining())
+    except GeminiTimeout as e:
+        log.warning("❌ Gemini timed out: %s", e)
+        count("gemini_timeouts")
+        return GEMINI_TIMEOUT_MESSAGE
     except Exception as e:
+        log.error("❌ Gemini API error: %s", e)
+        count("gemini_errors")
         return f"❌ Gemini API error: {e}"
+    finally:
+        timing("gemini", time.monotonic() - start)
 
 # Helper functions for ES and Gemini API
 def report_es_results(keywords, wiki_data):
-    print(f"Retrieved Wikipedia data for keywords: {keywords}")
-    print(f"Wikipedia data: {[w['title'] for w in wiki_data]}")
+    context = current_request()
+    if context is not None:
+        context.set(keywords=len(keywords), articles=len(wiki_data))
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Retrieved Wikipedia data for keywords %s: %s", keywords, [w['title'] for w in wiki_data])
 
-def gen_json_output(keywords, conspiracy_text, wiki_data):
-    return jsonify({
+def gen_output(keywords, conspiracy_text, wiki_data) -> dict:
+    return {
         "keywords": keywords,
         "generated_conspiracy": conspiracy_text,
         "wikipedia_sources": [
             {"title": d["title"], "url": d.get("source_url", "N/A")}
             for d in wiki_data
         ]
-    })
+    }
+
+def gen_json_output(keywords, conspiracy_text, wiki_data):
+    return jsonify(gen_output(keywords, conspiracy_text, wiki_data))
+
+# Raised by the search step of a generation model when there is nothing to generate from
+class SearchError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def parse_keywords(query: str) -> list:
+    return [k.strip() for k in query.split(",") if k.strip()]
+
+# Looks up keywords once, for reuse across several generations (see genV3 and /generate/batch).
+# Returns a dict of lowercased keyword -> hits (None when nothing was found). Only the first hit
+# (the anchor) and, in the searchV2 fallback, the first article_limit hits are ever used.
+def resolve_keywords(es, connected, keywords, deadline: Deadline = None, article_limit: int = 10) -> dict:
+    unique = list(dict.fromkeys(k.lower() for k in keywords))
+    if not unique:
+        return {}
+    return dict(zip(unique, esFieldMulti(es, connected, unique, "title", deadline=deadline, size=article_limit)))
 
 ## Base Generation Models for ES and Gemini API
-def genV1(es, connected, GEMINI_API_KEY, query):
-    keywords = [k.strip() for k in query.split(",")]
+# Each model has a search step (searchVn) returning the Wikipedia data to generate from,
+# and a genVn wrapper that runs the search and Gemini and builds the Flask response.
+
+def searchV1(es, connected, keywords, deadline: Deadline = None) -> list:
     wiki_data = []
     for k in keywords:
-        hit = esV1(es, connected, k)
+        hit = esV1(es, connected, k, deadline=deadline)
         if hit is not None:
             wiki_data.extend(hit)
 
     if not wiki_data:
-        return jsonify({"error": "No Wikipedia data found for the provided keywords"}), 404
-
-    report_es_results(keywords, wiki_data)
-    conspiracy_text = gem_consp(GEMINI_API_KEY, keywords, wiki_data)
-    return gen_json_output(keywords, conspiracy_text, wiki_data)
-
-def genV2(es, connected, GEMINI_API_KEY, query, article_limit=10):
-    keywords = [k.strip() for k in query.split(",")]
+        raise SearchError("No Wikipedia data found for the provided keywords", 404)
+    return wiki_data
 
-    # Bail and call genV1 if less than 2 keywords
+def searchV2(es, connected, keywords, article_limit=10, deadline: Deadline = None, resolved: dict = None) -> list:
+    # Bail and call searchV1 if less than 2 keywords
     if len(keywords) < 2:
-        print("❌ Less than 2 keywords provided, falling back to genV1")
-        return genV1(es, connected, GEMINI_API_KEY, query)
+        log.debug("❌ Less than 2 keywords provided, falling back to genV1")
+        return searchV1(es, connected, keywords, deadline)
 
+    resolved = resolved or {}
     wiki_data = []
+    keyword_hits = []
 
     # Add individual hits for each keyword, triggering Wikipedia fallback if not in ES
-    print(" ----- Step (1 / 2) -----")
-    print("🔁 Individual Keyword Search")
     for keyword in keywords:
-        print(f"🔍 Querying: {keyword}")
-        hit = esField(es, connected, keyword, "title")
+        if keyword.lower() in resolved:
+            hit = resolved[keyword.lower()]
+        else:
+            hit = esField(es, connected, keyword, "title", deadline=deadline)
+        keyword_hits.append(hit)
         if hit:
-            print(f"✅ Data found for {keyword}: {[h['title'] for h in hit]}")
+            log.debug("✅ Data found for %s: %d articles", keyword, len(hit))
             wiki_data.extend(hit)
         else:
-            print(f"❌ No data found for keyword: {keyword}")
+            log.debug("❌ No data found for keyword: %s", keyword)
 
     # Check for cross-reference hits first using the relaxed query logic
-    print(" ----- Step (2 / 2) -----")
-    print(f"🔁 Cross Reference: {keywords[0]} and {keywords[1]}")
-    cross_ref_hits = esV2(es, connected, keywords[0], keywords[1])
+    # The related article index is keyed by title, so use the titles the keywords resolved to
+    titles = [hit[0]['title'] if hit else keyword for keyword, hit in zip(keywords[:2], keyword_hits[:2])]
+    cross_ref_hits = related_bridges(es, connected, titles[0], titles[1], deadline)
+    if cross_ref_hits is None:
+        cross_ref_hits = esV2(es, connected, keywords[0], keywords[1], deadline=deadline)
     if cross_ref_hits:
-        print(f"✅ Cross-ref hits found: {[h['title'] for h in cross_ref_hits]}")
+        log.debug("✅ Cross-ref hits found: %d articles", len(cross_ref_hits))
         wiki_data.extend(cross_ref_hits) # Limit to first 3 hits
     else:
-        print(f"⚠️ No cross-ref hits found for: {keywords[0]} and {keywords[1]}")
-
-    print("----- Finished ------")
+        log.debug("⚠️ No cross-ref hits found for: %s and %s", keywords[0], keywords[1])
 
     if not wiki_data:
-        return jsonify({"error": "No Wikipedia data found for the provided keywords"}), 404
+        raise SearchError("No Wikipedia data found for the provided keywords", 404)
 
     # Remove duplicates based on title
-    wiki_data = clean_duplicate_hits(wiki_data)[:article_limit]
-    report_es_results(keywords, wiki_data)
-    conspiracy_text = gem_consp(GEMINI_API_KEY, keywords, wiki_data)
+    return clean_duplicate_hits(wiki_data)[:article_limit]
 
-    return gen_json_output(keywords, conspiracy_text, wiki_data)
+# Runs a search step and Gemini, and builds the Flask response
+def run_generation(search_step, GEMINI_API_KEY, keywords, deadline: Deadline = None):
+    try:
+        wiki_data = search_step()
+    except SearchError as e:
+        return jsonify({"error": e.message}), e.status
 
-def genV3(es, connected, GEMINI_API_KEY, query, depth=2, article_limit=10):
-    keywords = [k.strip() for k in query.split(",")]
+    report_es_results(keywords, wiki_data)
+    conspiracy_text = gem_consp(GEMINI_API_KEY, keywords, wiki_data, deadline=deadline)
+    return gen_json_output(keywords, conspiracy_text, wiki_data)
 
-    if len(keywords) < 2:
-        return jsonify({"error": "Please provide at least two keywords for comparison"}), 400
+def genV1(es, connected, GEMINI_API_KEY, query, deadline: Deadline = None):
+    keywords = parse_keywords(query)
+    return run_generation(lambda: searchV1(es, connected, keywords, deadline), GEMINI_API_KEY, keywords, deadline)
 
-    wiki_data = []
-    # Get information for each keyword individually
-    for keyword in keywords:
-        hit = esField(es, connected, keyword, "title")
-        if hit:
-            wiki_data.append(hit[0])  # Assume the first hit is the desired topic
-        else:
-            return jsonify({"error": f"⚠️ No hits found for keyword: {keyword} - Exiting Search"}), 400
+def genV2(es, connected, GEMINI_API_KEY, query, article_limit=10, deadline: Deadline = None):
+    keywords = parse_keywords(query)
+    return run_generation(lambda: searchV2(es, connected, keywords, article_limit, deadline), GEMINI_API_KEY, keywords, deadline)
 
-    # Recursive cross-reference function
-    def cross_ref(topic1, topic2, depth, black_list=[]):
-        black_list = black_list.copy()
-        black_list.extend([topic1.lower(), topic2.lower()])
+# Recursive cross-reference search for the chain of articles connecting topic1 to topic2.
+# Returns (Candidates, total views). Once the deadline has passed, the best path found so far is returned.
+# The black list is a frozenset shared by the recursive calls; each level extends it into a new one.
+def cross_ref(es, connected, topic1, topic2, depth, black_list=frozenset(), deadline: Deadline = None):
+    deadline = deadline or Deadline()
+    black_list = black_list | {topic1.lower(), topic2.lower()}
 
-        if depth <= 0:
-            return ([], 0)
+    if depth <= 0 or deadline.expired():
+        return ([], 0)
 
-        hits = esV2(es, connected, topic1, topic2)
-        if not hits:
-            return ([], 0)
+    hits = bridge_hits(es, connected, topic1, topic2, deadline=deadline)
+    if not hits:
+        return ([], 0)
 
-        sub_hits = []  # tuples: ([start->middle topics], middle topic, [middle->end topics], total topics, total views)
-        for hit in hits:
-            hit_title = hit['title']
-            if hit_title.lower() in black_list:
+    sub_hits = []  # tuples: ([start->middle topics], middle topic, [middle->end topics], total topics, total views)
+    for hit in hits:
+        hit_title = hit.title
+        if hit_title.lower() in black_list:
+            continue
+
+        # Out of time, keep what has been explored so far
+        if deadline.expired():
+            log.debug("⏱️ Request budget exhausted, returning best path found for: %s and %s", topic1, topic2)
+            count("budget_exhausted")
+            break
+
+        (sm, sm_views) = cross_ref(es, connected, topic1, hit_title, depth - 1, black_list, deadline)
+        me_black_list = black_list | {t.title.lower() for t in sm} if sm else black_list
+
+        (me, me_views) = cross_ref(es, connected, hit_title, topic2, depth - 1, me_black_list, deadline)
+        sub_views = sm_views + me_views + hit.views
+        sub_len = len(sm) + len(me) + 1
+        sub_hits.append((sm, hit, me, sub_len, sub_views))
+
+    if sub_hits:
+        sub_hits.sort(key=lambda x: (x[3], x[4]), reverse=True)
+        start = sub_hits[0][0]
+        middle = sub_hits[0][1]
+        end = sub_hits[0][2]
+        combined_topics = start + [middle] + end
+        total_views = sub_hits[0][4]
+        return (combined_topics, total_views)
+
+    return ([], 0)
+
+# Path search presets selectable per request ("mode"), trading path quality for latency.
+# Exhaustive search explores every hit to full depth; beam search keeps the best beam_width
+# partial paths per level, so the number of ES calls is at most beam_width * depth.
+SEARCH_PRESETS = {
+    "exhaustive": {"strategy": "exhaustive", "depth": 2},
+    "fast": {"strategy": "beam", "depth": 2, "beam_width": 2},
+    "balanced": {"strategy": "beam", "depth": 3, "beam_width": 3},
+    "thorough": {"strategy": "beam", "depth": 4, "beam_width": 5},
+}
+DEFAULT_SEARCH_MODE = os.getenv("SEARCH_MODE", "exhaustive")
+
+# Weights of the beam search score for a single article
+BEAM_VIEWS_WEIGHT = 0.6
+BEAM_RELEVANCE_WEIGHT = 0.4
+# Daily views at which the views part of the score saturates
+BEAM_VIEWS_SATURATION = 100000
+
+# Scores one Candidate for beam search from its daily views and ES relevance (relative to the best hit)
+def beam_score(hit: Candidate, max_relevance: float) -> float:
+    views = min(1.0, math.log1p(hit.views) / math.log1p(BEAM_VIEWS_SATURATION))
+    relevance = hit.score / max_relevance if max_relevance else 0.0
+    return BEAM_VIEWS_WEIGHT * views + BEAM_RELEVANCE_WEIGHT * relevance
+
+# Beam search for the chain of articles connecting topic1 to topic2.
+# Every level, each of the beam_width best partial paths bridges its oldest open gap with one ES query;
+# the new paths are scored and only the best beam_width survive. Returns (Candidates, total views).
+def beam_cross_ref(es, connected, topic1, topic2, depth, beam_width=3, deadline: Deadline = None):
+    deadline = deadline or Deadline()
+    pair_hits = {}  # (left, right) -> Candidates, so shared gaps are only queried once
+
+    # entries: (score, path as a tuple of Candidates between topic1 and topic2, open gaps as (left title, right title))
+    beam = [(0.0, (), ((topic1, topic2),))]
+
+    for level in range(depth):
+        if deadline.expired():
+            log.debug("⏱️ Request budget exhausted, returning best path found for: %s and %s", topic1, topic2)
+            count("budget_exhausted")
+            break
+
+        candidates = []
+        for (score, path, gaps) in beam:
+            if not gaps:
+                candidates.append((score, path, gaps))
                 continue
 
-            (sm, sm_views) = cross_ref(topic1, hit_title, depth - 1, black_list)
-            sm_titles = [t['title'].lower() for t in sm]
+            (left, right), rest = gaps[0], gaps[1:]
+            # The path survives unexpanded in case this gap has no usable bridge
+            candidates.append((score, path, rest))
 
-            (me, me_views) = cross_ref(hit_title, topic2, depth - 1, black_list + sm_titles)
-            hit_views = hit.get('daily_views', 0) if isinstance(hit.get('daily_views'), int) else 0
-            sub_views = sm_views + me_views + hit_views
-            sub_len = len(sm) + len(me) + 1
-            sub_hits.append((sm, hit, me, sub_len, sub_views))
+            key = (left.lower(), right.lower())
+            if key not in pair_hits:
+                pair_hits[key] = bridge_hits(es, connected, left, right, deadline=deadline) or []
+            hits = pair_hits[key]
+            if not hits:
+                continue
 
-        if sub_hits:
-            sub_hits.sort(key=lambda x: (x[3], x[4]), reverse=True)
-            start = sub_hits[0][0]
-            middle = sub_hits[0][1]
-            end = sub_hits[0][2]
-            combined_topics = start + [middle] + end
-            total_views = sub_hits[0][4]
-            return (combined_topics, total_views)
+            used = {topic1.lower(), topic2.lower()} | {h.title.lower() for h in path}
+            max_relevance = max(h.score for h in hits)
+            insert_at = 0 if left == topic1 else next(i for i, h in enumerate(path) if h.title == left) + 1
+
+            for hit in hits:
+                title = hit.title
+                if title.lower() in used:
+                    continue
+                new_path = path[:insert_at] + (hit,) + path[insert_at:]
+                new_gaps = rest + ((left, title), (title, right))
+                candidates.append((score + beam_score(hit, max_relevance), new_path, new_gaps))
+
+        # Prune to the best beam_width distinct paths
+        candidates.sort(key=lambda c: (c[0], len(c[1])), reverse=True)
+        beam = []
+        seen = set()
+        for candidate in candidates:
+            titles = tuple(h.title.lower() for h in candidate[1])
+            if titles in seen:
+                continue
+            seen.add(titles)
+            beam.append(candidate)
+            if len(beam) >= beam_width:
+                break
+
+    best_path = list(beam[0][1])
+    return (best_path, sum(h.views for h in best_path))
+
+# Runs the path search selected by a SEARCH_PRESETS entry
+def find_path(es, connected, topic1, topic2, search: dict, deadline: Deadline = None):
+    if search["strategy"] == "beam":
+        return beam_cross_ref(es, connected, topic1, topic2, search["depth"], search["beam_width"], deadline)
+    return cross_ref(es, connected, topic1, topic2, search["depth"], deadline=deadline)
+
+# Builds the search settings for a request from a preset name and optional overrides
+def get_search_settings(mode: str = None, depth: int = None, beam_width: int = None) -> dict:
+    mode = mode or DEFAULT_SEARCH_MODE
+    if not isinstance(mode, str) or mode not in SEARCH_PRESETS:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of: {', '.join(SEARCH_PRESETS)}")
+    search = dict(SEARCH_PRESETS[mode])
+    if depth is not None:
+        search["depth"] = depth
+    if beam_width is not None and search["strategy"] == "beam":
+        search["beam_width"] = beam_width
+    return search
+
+# Worker pool for the pairwise path searches of multi-keyword queries
+PAIR_SEARCH_WORKERS = int(os.getenv("PAIR_SEARCH_WORKERS", "4"))
+_pair_executor = ThreadPoolExecutor(max_workers=PAIR_SEARCH_WORKERS, thread_name_prefix="pair-search")
+
+# Drops the least viewed bridge articles from the longest paths until at most `budget` are left
+def trim_paths(paths: list, budget: int) -> list:
+    paths = [list(path) for path in paths]
+    while sum(len(path) for path in paths) > max(0, budget):
+        longest = max(paths, key=len)
+        longest.remove(min(longest, key=lambda c: c.views))
+    return paths
+
+# Joins the bridge articles of the paths between consecutive keywords into one chain of at most
+# article_limit articles. Like genV3 always has, the keyword articles themselves are not part of it.
+def bridge_chain(paths: list, article_limit: int) -> list:
+    return clean_duplicate_hits([c for path in trim_paths(paths, article_limit) for c in path])
+
+# Joins the keyword Candidates and the paths between consecutive keywords into one chain.
+# If the chain is longer than article_limit, the least viewed bridge articles are dropped first;
+# keyword articles are always kept.
+def stitch_chain(anchors: list, paths: list, article_limit: int) -> list:
+    paths = trim_paths(paths, article_limit - len(anchors))
+    chain = [anchors[0]]
+    for path, anchor in zip(paths, anchors[1:]):
+        chain.extend(path)
+        chain.append(anchor)
+    return clean_duplicate_hits(chain)
+
+# Below this much of the request budget, genV3 searches one level deep only
+SHALLOW_SEARCH_FRACTION = 0.5
+# Below this many seconds left, genV3 answers with the keyword articles instead of falling back to genV2
+GENV2_FALLBACK_MIN_BUDGET = 8.0
+
+# Connects any number of keywords: all keywords are resolved in one batched lookup
+# (unless already in `resolved`), then the paths between consecutive keywords are
+# searched concurrently and stitched into one chain.
+def searchV3(es, connected, keywords, article_limit=10, deadline: Deadline = None, search: dict = None, resolved: dict = None) -> list:
+    deadline = deadline or Deadline()
+    search = search or get_search_settings()
 
-        return ([], 0)
+    if len(keywords) < 2:
+        raise SearchError("Please provide at least two keywords for comparison", 400)
 
-    (cross_ref_hits, cross_ref_views) = cross_ref(keywords[0], keywords[1], depth)
+    # Get information for every keyword not looked up yet in one request
+    resolved = dict(resolved or {})
+    missing = [k for k in keywords if k.lower() not in resolved]
+    resolved.update(resolve_keywords(es, connected, missing, deadline, article_limit))
 
-    # Fallback to genV2 if no cross-reference hits are found
-    if not cross_ref_hits or len(cross_ref_hits) <= 1:
-        print(f"⚠️ No hits found for: {keywords[0]} and {keywords[1]} - Exiting Search")
-        print(f"Falling back to genV2 for {keywords[0]} and {keywords[1]}")
-        return genV2(es, connected, GEMINI_API_KEY, query, article_limit)
+    anchors = []
+    for keyword in keywords:
+        hit = resolved.get(keyword.lower())
+        if hit:
+            anchors.append(Candidate.from_doc(hit[0]))  # Assume the first hit is the desired topic
+        else:
+            raise SearchError(f"⚠️ No hits found for keyword: {keyword} - Exiting Search", 400)
+
+    if deadline.fraction_left() < SHALLOW_SEARCH_FRACTION and search["depth"] > 1:
+        log.debug("⏱️ Request budget running low, reducing search depth from %d to 1", search['depth'])
+        search = {**search, "depth": 1}
+
+    # Search every consecutive keyword pair at the same time, by the titles the keywords resolved to
+    # so the related article index (keyed by title) can answer the bridge lookups
+    titles = [anchor.title for anchor in anchors]
+    pairs = list(zip(titles, titles[1:]))
+    if len(pairs) == 1:
+        paths = [find_path(es, connected, titles[0], titles[1], search, deadline)[0]]
+    else:
+        futures = [submit(_pair_executor, find_path, es, connected, topic1, topic2, search, deadline) for (topic1, topic2) in pairs]
+        paths = [future.result()[0] for future in futures]
 
-    wiki_data = [wiki_data[0]] + cross_ref_hits + [wiki_data[1]]
-    print(f"🔍 Cross-reference hits found: {[ch['title'] for ch in wiki_data]}")
+    # Fallback to genV2 if no cross-reference hits are found
+    if all(len(path) <= 1 for path in paths):
+        log.debug("⚠️ No hits found between: %s - Exiting Search", keywords)
+        if deadline.remaining() >= GENV2_FALLBACK_MIN_BUDGET:
+            log.debug("Falling back to genV2 for %s", keywords)
+            count("genv2_fallbacks")
+            return searchV2(es, connected, keywords, article_limit, deadline, resolved)
+        # Not enough time for another round of searches, use what we already have
+        log.debug("⏱️ Skipping genV2 fallback, using keyword articles for %s", keywords)
+        chain = stitch_chain(anchors, paths, article_limit)
+    else:
+        chain = bridge_chain(paths, article_limit)
 
-    # Prune via delete dupolicates
-    wiki_data = clean_duplicate_hits(wiki_data)[:article_limit]
+    # Only the articles in the final chain are fetched in full
+    wiki_data = hydrate(es, connected, chain, deadline)
+    log.debug("🔍 Cross-reference hits found: %d articles", len(wiki_data))
+    return wiki_data
 
-    report_es_results(keywords, wiki_data)
-    conspiracy_text = gem_consp(GEMINI_API_KEY, keywords, cross_ref_hits)
-    return gen_json_output(keywords, conspiracy_text, cross_ref_hits)
\ No newline at end of file
+def genV3(es, connected, GEMINI_API_KEY, query, depth=None, article_limit=10, deadline: Deadline = None, search: dict = None):
+    keywords = parse_keywords(query)
+    search = search or get_search_settings(depth=depth)
+    return run_generation(lambda: searchV3(es, connected, keywords, article_limit, deadline, search), GEMINI_API_KEY, keywords, deadline)
\ No newline at end of file
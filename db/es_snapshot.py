@@ -0,0 +1,183 @@
+import argparse
+import os
+from datetime import datetime, timezone
+from elasticsearch_import import (
+    INDEX_NAME, DATA_FOLDER, wait_for_es, create_index_with_mapping, load_corpus, import_documents
+)
+from es_client import ES_REPLICAS, BULK, get_client
+
+# Shared filesystem snapshot repository. The location is the path inside the Elasticsearch
+# container and must be listed in its path.repo setting (see the compose files).
+SNAPSHOT_REPO = os.getenv("SNAPSHOT_REPO", "wikipedia_snapshots")
+SNAPSHOT_REPO_PATH = os.getenv("SNAPSHOT_REPO_PATH", "/usr/share/elasticsearch/snapshots")
+# Restored indices kept after a swap, the live one included, so the previous one can be swapped back
+SNAPSHOT_KEEP_INDICES = int(os.getenv("SNAPSHOT_KEEP_INDICES", "2"))
+# How long to wait for the replicas of a new index before giving up on the swap
+REPLICA_WAIT_TIMEOUT = "30m"
+
+# Build-time index settings: no refreshes or replicas while bulk indexing
+BUILD_SETTINGS = {"index": {"number_of_replicas": 0, "refresh_interval": "-1"}}
+
+def register_repository(es, readonly=False):
+    es.snapshot.create_repository(
+        name=SNAPSHOT_REPO,
+        type="fs",
+        settings={"location": SNAPSHOT_REPO_PATH, "compress": True, "readonly": readonly}
+    )
+
+def versioned_index_name():
+    """Versioned indices are named after the alias and sort by build time: wikipedia-20250101-120000."""
+    return f"{INDEX_NAME}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}"
+
+def list_snapshots(es):
+    """Successful corpus snapshots in the repository, oldest first."""
+    response = es.snapshot.get(repository=SNAPSHOT_REPO, snapshot="_all")
+    snapshots = [
+        snapshot for snapshot in response["snapshots"]
+        if snapshot["state"] == "SUCCESS" and snapshot["snapshot"].startswith(f"{INDEX_NAME}-")
+    ]
+    return sorted(snapshots, key=lambda snapshot: snapshot["start_time_in_millis"])
+
+# Index the corpus into a fresh versioned index and snapshot it. The build index is
+# merged down to one segment first, so restoring it needs no merging on the serving node.
+def build(data_folder=DATA_FOLDER, limit=None, keep_index=False):
+    es = get_client(BULK)
+    docs = load_corpus(data_folder)
+    if limit:
+        docs = dict(list(docs.items())[:limit])
+    if not docs:
+        print("❌ No valid data to snapshot")
+        return None
+
+    index_name = versioned_index_name()
+    create_index_with_mapping(es, index_name, settings=BUILD_SETTINGS)
+    counts = import_documents(es, docs, index_name)
+    if counts["failed"]:
+        print(f"❌ {counts['failed']} documents failed to import, not snapshotting '{index_name}'")
+        es.indices.delete(index=index_name)
+        return None
+
+    es.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": None}})
+    es.indices.refresh(index=index_name)
+    es.options(request_timeout=3600).indices.forcemerge(index=index_name, max_num_segments=1)
+    documents = es.count(index=index_name)["count"]
+
+    register_repository(es)
+    es.options(request_timeout=3600).snapshot.create(
+        repository=SNAPSHOT_REPO,
+        snapshot=index_name,
+        indices=index_name,
+        include_global_state=False,
+        wait_for_completion=True,
+        metadata={"documents": documents, "built_at": datetime.now(timezone.utc).isoformat()}
+    )
+    print(f"✅ Snapshot '{index_name}' with {documents} documents written to repository '{SNAPSHOT_REPO}'")
+
+    if not keep_index:
+        es.indices.delete(index=index_name)
+    return index_name
+
+def alias_targets(es):
+    """Indices the alias points to, and whether a plain index still uses the alias name."""
+    if not es.indices.exists(index=INDEX_NAME):
+        return [], False
+    indices = list(es.indices.get(index=INDEX_NAME))
+    return [name for name in indices if name != INDEX_NAME], INDEX_NAME in indices
+
+def swap_alias(es, index_name):
+    """
+    Point the alias at index_name in one atomic update. A plain index with the alias name
+    (from a pre-snapshot import) is removed in the same update, so searches never see a gap.
+    """
+    targets, concrete = alias_targets(es)
+    actions = [{"add": {"index": index_name, "alias": INDEX_NAME}}]
+    actions += [{"remove": {"index": target, "alias": INDEX_NAME}} for target in targets if target != index_name]
+    if concrete:
+        actions.append({"remove_index": {"index": INDEX_NAME}})
+    es.indices.update_aliases(actions=actions)
+    print(f"✅ Alias '{INDEX_NAME}' now points to '{index_name}'")
+
+def set_replicas(es, index_name, replicas=ES_REPLICAS):
+    """Give a freshly built or restored index its ES_REPLICAS replicas and wait until they are allocated."""
+    es.indices.put_settings(index=index_name, settings={"index": {"number_of_replicas": replicas}})
+    health = es.options(request_timeout=3600).cluster.health(
+        index=index_name, wait_for_status="green", timeout=REPLICA_WAIT_TIMEOUT
+    )
+    if health.get("timed_out"):
+        print(f"❌ Replicas of '{index_name}' not allocated after {REPLICA_WAIT_TIMEOUT} ({health['status']})")
+        return False
+    return True
+
+def delete_old_indices(es, current):
+    versioned = sorted(es.indices.get(index=f"{INDEX_NAME}-*"))
+    for name in versioned[:-max(1, SNAPSHOT_KEEP_INDICES)]:
+        if name != current:
+            es.indices.delete(index=name)
+            print(f"🗑️ Deleted old index '{name}'")
+
+# Restore a snapshot (the latest by default) and swap the alias to it once its
+# document count matches the snapshot. Nothing is re-analyzed on this node.
+def restore(snapshot_name=None):
+    es = get_client(BULK)
+    register_repository(es, readonly=True)
+
+    snapshots = list_snapshots(es)
+    if snapshot_name:
+        snapshots = [snapshot for snapshot in snapshots if snapshot["snapshot"] == snapshot_name]
+    if not snapshots:
+        print(f"❌ No snapshot {snapshot_name or ''} found in repository '{SNAPSHOT_REPO}'")
+        return None
+    snapshot = snapshots[-1]
+    index_name = snapshot["indices"][0]
+
+    if es.indices.exists(index=index_name):
+        print(f"Index '{index_name}' is already restored")
+    else:
+        print(f"Restoring snapshot '{snapshot['snapshot']}'...")
+        es.options(request_timeout=3600).snapshot.restore(
+            repository=SNAPSHOT_REPO,
+            snapshot=snapshot["snapshot"],
+            indices=index_name,
+            include_global_state=False,
+            include_aliases=False,
+            index_settings={"index.number_of_replicas": 0},
+            wait_for_completion=True
+        )
+
+    expected = (snapshot.get("metadata") or {}).get("documents")
+    documents = es.count(index=index_name)["count"]
+    if expected is not None and documents != expected:
+        print(f"❌ '{index_name}' has {documents} documents, snapshot has {expected}. Alias left unchanged")
+        return None
+    if not set_replicas(es, index_name):
+        return None
+
+    swap_alias(es, index_name)
+    delete_old_indices(es, index_name)
+    print(f"✅ Restored '{index_name}' with {documents} documents")
+    return index_name
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build Elasticsearch snapshots of the corpus and restore them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Index data/articles into a new index and snapshot it")
+    build_parser.add_argument("--data-folder", default=DATA_FOLDER)
+    build_parser.add_argument("--limit", type=int, help="Only snapshot the first N documents (for testing)")
+    build_parser.add_argument("--keep-index", action="store_true", help="Keep the build index after the snapshot")
+    restore_parser = subparsers.add_parser("restore", help="Restore a snapshot and point the alias at it")
+    restore_parser.add_argument("--snapshot", help="Snapshot name, defaults to the latest")
+    subparsers.add_parser("list", help="List the snapshots in the repository")
+    args = parser.parse_args()
+
+    wait_for_es()
+    if args.command == "build":
+        if build(args.data_folder, args.limit, args.keep_index) is None:
+            raise SystemExit(1)
+    elif args.command == "restore":
+        if restore(args.snapshot) is None:
+            raise SystemExit(1)
+    else:
+        es = get_client(BULK)
+        register_repository(es, readonly=True)
+        for snapshot in list_snapshots(es):
+            print(f"{snapshot['snapshot']}: {(snapshot.get('metadata') or {}).get('documents')} documents")
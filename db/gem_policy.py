@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import google.generativeai as genai
+import structured_log
+from structured_log import get_logger
+
+log = get_logger("gemini")
+
+# Shared pool for Gemini calls. Losing hedges keep running until their own
+# request timeout, so this is sized above the expected API concurrency.
+GEMINI_MAX_WORKERS = int(os.getenv("GEMINI_MAX_WORKERS", "16"))
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix="gemini")
+
+# Number of recent primary latencies kept for the hedge percentile
+LATENCY_WINDOW = 200
+# Hedge threshold used until enough latencies have been observed
+MIN_SAMPLES_FOR_PERCENTILE = 20
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class GemPolicy:
+    """
+    Deadline, hedging and fallback settings for a single Gemini generation.
+
+    - deadline: hard limit in seconds for the whole call, hedges included
+    - hedge: send a second request once the primary is slower than
+      hedge_percentile of recent latencies (never earlier than hedge_min_delay)
+    - fallback_model: cheaper model sent the short prompt once less than
+      fallback_margin seconds remain, or straight away if every attempt failed
+    """
+
+    def __init__(self, model="gemini-1.5-flash", deadline=20.0, hedge=False, hedge_model=None,
+                 hedge_percentile=95.0, hedge_min_delay=2.0, fallback_model=None,
+                 fallback_margin=5.0, short_prompt_chars=600):
+        self.model = model
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_model = hedge_model or model
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.fallback_model = fallback_model
+        self.fallback_margin = fallback_margin
+        self.short_prompt_chars = short_prompt_chars
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+            deadline=float(os.getenv("GEMINI_DEADLINE_S", "20")),
+            hedge=_env_bool("GEMINI_HEDGE"),
+            hedge_model=os.getenv("GEMINI_HEDGE_MODEL") or None,
+            hedge_percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95")),
+            hedge_min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY_S", "2")),
+            fallback_model=os.getenv("GEMINI_FALLBACK_MODEL") or None,
+            fallback_margin=float(os.getenv("GEMINI_FALLBACK_MARGIN_S", "5")),
+            short_prompt_chars=int(os.getenv("GEMINI_SHORT_PROMPT_CHARS", "600")),
+        )
+
+
+class GeminiTimeout(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_latencies = deque(maxlen=LATENCY_WINDOW)
+_stats = {
+    "calls": 0,
+    "primary_wins": 0,
+    "hedges_fired": 0,
+    "hedge_wins": 0,
+    "fallbacks_fired": 0,
+    "fallback_wins": 0,
+    "timeouts": 0,
+    "failures": 0,
+}
+
+
+def _count(key, n=1):
+    with _lock:
+        _stats[key] += n
+    # Also counted on the current request's summary line
+    if key != "calls":
+        structured_log.count(f"gemini_{key}", n)
+
+
+def _record_latency(seconds):
+    with _lock:
+        _latencies.append(seconds)
+
+
+def latency_percentile(p):
+    """Returns the p-th percentile of recent primary latencies, or None without enough samples."""
+    with _lock:
+        samples = sorted(_latencies)
+    if len(samples) < MIN_SAMPLES_FOR_PERCENTILE:
+        return None
+    index = min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    calls = stats["calls"] or 1
+    hedges = stats["hedges_fired"] or 1
+    stats["hedge_fire_rate"] = round(stats["hedges_fired"] / calls, 4)
+    stats["hedge_win_rate"] = round(stats["hedge_wins"] / hedges, 4)
+    stats["latency_p50_s"] = latency_percentile(50)
+    stats["latency_p95_s"] = latency_percentile(95)
+    return stats
+
+
+def _generate(model_name, prompt, timeout):
+    model = genai.GenerativeModel(model_name)
+    response = model.generate_content(prompt, request_options={"timeout": max(timeout, 1.0)})
+    # .text raises if the candidate was blocked or empty
+    text = response.text
+    if not text:
+        raise ValueError("Empty response from Gemini")
+    return text
+
+
+def hedged_generate(policy: GemPolicy, prompt: str, short_prompt: str = None, deadline: float = None) -> str:
+    """
+    Runs a Gemini generation under the policy and returns the first good response text.
+    `deadline` caps the policy deadline (seconds remaining in the caller's budget).
+    Raises GeminiTimeout when nothing succeeded in time, or the last error if every attempt failed.
+    """
+    budget = policy.deadline if deadline is None else min(policy.deadline, deadline)
+    start = time.monotonic()
+    deadline_at = start + budget
+    _count("calls")
+
+    pending = {}  # future -> attempt kind ("primary", "hedge", "fallback")
+    last_error = None
+
+    def launch(kind, model_name, attempt_prompt):
+        remaining = deadline_at - time.monotonic()
+        future = structured_log.submit(_executor, _generate, model_name, attempt_prompt, remaining)
+        pending[future] = kind
+        if kind == "primary":
+            # Recorded whenever the primary finishes, also after losing to a hedge or the
+            # deadline, so slow primaries keep the hedge percentile honest
+            future.add_done_callback(record_primary)
+
+    def record_primary(future):
+        if not future.cancelled() and future.exception() is None:
+            _record_latency(time.monotonic() - start)
+
+    hedge_at = None
+    if policy.hedge:
+        threshold = latency_percentile(policy.hedge_percentile)
+        hedge_at = start + max(policy.hedge_min_delay, threshold or policy.hedge_min_delay)
+
+    fallback_at = None
+    if policy.fallback_model:
+        fallback_at = deadline_at - policy.fallback_margin
+
+    # Too close to the deadline for the full prompt, go straight to the fallback
+    if fallback_at is not None and start >= fallback_at:
+        fallback_at = None
+        _count("fallbacks_fired")
+        launch("fallback", policy.fallback_model, short_prompt or prompt)
+    else:
+        launch("primary", policy.model, prompt)
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline_at:
+            break
+
+        next_event = deadline_at
+        if hedge_at is not None:
+            next_event = min(next_event, hedge_at)
+        if fallback_at is not None:
+            next_event = min(next_event, fallback_at)
+
+        done, _ = wait(list(pending), timeout=max(0.0, next_event - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            kind = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                last_error = e
+                log.warning("⚠️ Gemini %s attempt failed: %s", kind, e)
+                continue
+
+            _count(f"{kind}_wins")
+            return text
+
+        now = time.monotonic()
+        if hedge_at is not None and (now >= hedge_at or not pending):
+            hedge_at = None
+            _count("hedges_fired")
+            launch("hedge", policy.hedge_model, prompt)
+        elif fallback_at is not None and (now >= fallback_at or not pending):
+            fallback_at = None
+            _count("fallbacks_fired")
+            launch("fallback", policy.fallback_model, short_prompt or prompt)
+
+    if pending:
+        _count("timeouts")
+        raise GeminiTimeout(f"No Gemini response within {budget:.1f}s")
+
+    _count("failures")
+    raise last_error if last_error else GeminiTimeout("No Gemini attempt was made")
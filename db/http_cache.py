@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+from es_client import index_info
+from structured_log import get_logger
+
+# Brotli is installed from requirements.txt; gzip is still used where it is missing, e.g. a bare local environment
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = get_logger("http_cache")
+
+# Browser and proxy cache lifetimes in seconds
+GENERATE_CACHE_MAX_AGE = int(os.getenv("GENERATE_CACHE_MAX_AGE", "3600"))
+SAMPLES_CACHE_MAX_AGE = int(os.getenv("SAMPLES_CACHE_MAX_AGE", "60"))
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {"application/json", "text/plain"}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def index_version(es, index="wikipedia"):
+    """
+    (version, last modified) of the index serving requests: the concrete index behind the alias
+    and its UUID, so every restore or reimport changes it. (None, None) if Elasticsearch is unavailable.
+    """
+    try:
+        info = index_info(es, index)
+    except Exception as e:
+        log.warning("⚠️ Could not read the index version: %s", e)
+        return None, None
+    return f"{info['name']}-{info['uuid']}", datetime.fromtimestamp(info["created_ms"] / 1000, tz=timezone.utc)
+
+
+def samples_seed(at: float = None) -> int:
+    """/samples random seed, which changes once per cache lifetime so every response within that window is the same."""
+    at = time.time() if at is None else at
+    return int(at // SAMPLES_CACHE_MAX_AGE) if SAMPLES_CACHE_MAX_AGE > 0 else int(at)
+
+
+def make_etag(*parts) -> str:
+    # Weak, since the body differs between compressed and uncompressed copies and between generations
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def not_modified(etag: str, last_modified, max_age: int):
+    """A 304 response if the client's copy (If-None-Match / If-Modified-Since) is still valid, else None."""
+    if is_resource_modified(request.environ, etag=f'W/"{etag}"', last_modified=last_modified):
+        return None
+    return set_cache_headers(Response(status=304), etag, last_modified, max_age)
+
+
+def set_cache_headers(response, etag: str, last_modified, max_age: int):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def no_store(response):
+    response.cache_control.no_store = True
+    return response
+
+
+def compress_response(response):
+    """after_request hook: brotli or gzip encode JSON and text bodies the client accepts."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response.vary.add("Accept-Encoding")
+    return response
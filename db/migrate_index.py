@@ -0,0 +1,173 @@
+"""
+Moves the live index to the current mapping (MAPPING_VERSION in elasticsearch_import.py):
+reindexes it into a new versioned index, points the `wikipedia` alias at it and reports the
+latency of the API's queries on the old and the new index.
+
+    python3 migrate_index.py             # migrate if the live index is older than MAPPING_VERSION
+    python3 migrate_index.py --dry-run   # build and measure the new index, keep the alias as it is
+"""
+import argparse
+import random
+import statistics
+import time
+from elasticsearch_import import INDEX_NAME, MAPPING_VERSION, wait_for_es, create_index_with_mapping
+from es_client import BULK, READ, get_client, mapping_version
+from es_snapshot import BUILD_SETTINGS, alias_targets, swap_alias, set_replicas, delete_old_indices, versioned_index_name
+from es_gen_models import (
+    CANDIDATE_SOURCE, CANDIDATE_FIELDS_V2, create_span_near_query, create_field_clauses, sample_titles
+)
+
+# Seconds between reindex progress checks
+PROGRESS_INTERVAL_S = 10
+LATENCY_RUNS = 20
+
+
+def live_index(es):
+    """The index currently serving the alias (a plain `wikipedia` index from before snapshots counts too)."""
+    targets, concrete = alias_targets(es)
+    if concrete:
+        return INDEX_NAME
+    return sorted(targets)[-1] if targets else None
+
+
+def reindex(es, source: str, dest: str) -> bool:
+    """Copies every document of source into dest (created with the current mapping). Returns False on failures."""
+    create_index_with_mapping(es, dest, settings=BUILD_SETTINGS)
+    task = es.reindex(source={"index": source}, dest={"index": dest}, slices="auto",
+                      wait_for_completion=False, refresh=False)["task"]
+    while True:
+        time.sleep(PROGRESS_INTERVAL_S)
+        status = es.tasks.get(task_id=task)
+        progress = status["task"]["status"]
+        print(f"⏳ Reindexed {progress.get('created', 0) + progress.get('updated', 0)} of {progress.get('total', '?')} documents")
+        if status.get("completed"):
+            break
+
+    failures = status.get("response", {}).get("failures") or status.get("error")
+    if failures:
+        print(f"❌ Reindex into '{dest}' failed: {failures}")
+        return False
+
+    es.indices.put_settings(index=dest, settings={"index": {"refresh_interval": None}})
+    es.indices.refresh(index=dest)
+    es.options(request_timeout=3600).indices.forcemerge(index=dest, max_num_segments=1)
+    return True
+
+
+def latency_queries(topics: list, version: int) -> dict:
+    """The API's query shapes, written for an index of the given mapping version: name -> search() arguments."""
+    pairs = list(zip(topics, topics[1:]))
+    candidate_fields = CANDIDATE_FIELDS_V2 if version >= 2 else {"_source": CANDIDATE_SOURCE}
+    return {
+        # Keyword resolution (esFieldMulti), full documents
+        "keyword lookup": [
+            {"query": {"bool": {"should": create_field_clauses(topic, "title", 1)}}, "size": 50}
+            for topic in topics
+        ],
+        # Bridge candidates between two topics (esV2 with candidates=True)
+        "candidate search": [
+            {"query": {"bool": {"must": [
+                {"bool": {"should": [create_span_near_query(t, "title", 1), create_span_near_query(t, "wikipedia_content", 1)]}}
+                for t in pair
+            ]}}, "size": 50, **candidate_fields}
+            for pair in pairs
+        ],
+        # Exact title lookup
+        "exact title": [
+            {"query": {"term": {"title.lower": topic.lower()}} if version >= 2
+             else {"match_phrase": {"title": topic}}, "size": 1, **candidate_fields}
+            for topic in topics
+        ],
+        # Most viewed articles, which the index sort of v2 answers without visiting every document
+        "top by views": [
+            {"query": {"match_all": {}}, "sort": [{"daily_views": "desc"}], "size": 10,
+             "track_total_hits": False, **candidate_fields}
+        ],
+    }
+
+
+def measure(es, index: str, queries: dict, runs: int = LATENCY_RUNS) -> dict:
+    """Median and p90 of the ES `took` time (ms) and the round trip time (ms) of each query kind."""
+    results = {}
+    for name, bodies in queries.items():
+        took = []
+        round_trip = []
+        for i in range(runs):
+            body = bodies[i % len(bodies)]
+            start = time.perf_counter()
+            response = es.search(index=index, request_cache=False, **body)
+            round_trip.append((time.perf_counter() - start) * 1000)
+            took.append(response["took"])
+        took.sort()
+        round_trip.sort()
+        results[name] = {
+            "took_p50": statistics.median(took),
+            "took_p90": took[int(len(took) * 0.9)],
+            "round_trip_p50": round(statistics.median(round_trip), 1),
+        }
+    return results
+
+
+def print_latency(before: dict, after: dict, old: str, new: str):
+    print(f"📊 Query latency, '{old}' -> '{new}' (ms, ES took p50 / p90, round trip p50)")
+    for name in before:
+        b, a = before[name], after[name]
+        print(f"   {name:<17} {b['took_p50']:>6} / {b['took_p90']:<6} {b['round_trip_p50']:>7}  ->  "
+              f"{a['took_p50']:>6} / {a['took_p90']:<6} {a['round_trip_p50']:>7}")
+
+
+def migrate(dry_run=False, force=False, runs=LATENCY_RUNS):
+    es = get_client(BULK)
+    # Latency is measured through the nodes serving the API
+    reader = get_client(READ)
+    old = live_index(es)
+    if old is None:
+        print(f"❌ No '{INDEX_NAME}' index to migrate")
+        return None
+
+    old_version = mapping_version(es, old)
+    if old_version >= MAPPING_VERSION and not force:
+        print(f"✅ '{old}' already uses mapping v{old_version}")
+        return old
+
+    # Warm both indices up with the same queries before measuring
+    topics = sample_titles(es, random.randrange(1 << 30), 20)
+    old_queries = latency_queries(topics, old_version)
+    measure(reader, old, old_queries, runs=5)
+    before = measure(reader, old, old_queries, runs)
+
+    new = versioned_index_name()
+    print(f"Reindexing '{old}' (mapping v{old_version}) into '{new}' (mapping v{MAPPING_VERSION})...")
+    if not reindex(es, old, new):
+        es.indices.delete(index=new)
+        return None
+
+    documents, expected = es.count(index=new)["count"], es.count(index=old)["count"]
+    if documents != expected:
+        print(f"❌ '{new}' has {documents} documents, '{old}' has {expected}. Alias left unchanged")
+        return None
+    if not set_replicas(es, new):
+        return None
+
+    new_queries = latency_queries(topics, MAPPING_VERSION)
+    measure(reader, new, new_queries, runs=5)
+    after = measure(reader, new, new_queries, runs)
+    print_latency(before, after, old, new)
+
+    if dry_run:
+        print(f"Dry run, alias '{INDEX_NAME}' still points to '{old}'. '{new}' was kept for inspection")
+        return new
+    swap_alias(es, new)
+    delete_old_indices(es, new)
+    print(f"✅ Migrated {documents} documents to '{new}'")
+    return new
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="build and measure the new index without swapping the alias")
+    parser.add_argument("--force", action="store_true", help="reindex even if the live index uses the current mapping")
+    parser.add_argument("--runs", type=int, default=LATENCY_RUNS, help="searches per query kind when measuring latency")
+    args = parser.parse_args()
+    wait_for_es()
+    migrate(args.dry_run, args.force, args.runs)
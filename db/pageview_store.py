@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+from column_store import pack_titles, unpack_title, save_columns, load_columns
+
+# Raw pageview data, one directory of NumPy columns per category
+PAGEVIEWS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/pageviews")
+COLUMNS = ("title_bytes", "title_offsets", "total", "average")
+
+
+class PageviewStore:
+    """
+    Raw pageview data of one category, stored as NumPy columns:
+    - title_bytes / title_offsets: UTF-8 titles packed into one byte array
+    - total: total views over the download period
+    - average: average daily views
+    Loaded stores are memory-mapped, so queries only touch the columns they use
+    and titles are decoded only for the rows that are returned.
+    """
+
+    def __init__(self, title_bytes, title_offsets, total, average):
+        self.title_bytes = title_bytes
+        self.title_offsets = title_offsets
+        self.total = total
+        self.average = average
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a store from massviews rows ([{"label", "sum", "average"}])."""
+        title_bytes, offsets = pack_titles(str(row.get("label", "")) for row in rows)
+        total = np.array([row.get("sum", 0) or 0 for row in rows], dtype=np.int64)
+        average = np.array([row.get("average", 0) or 0 for row in rows], dtype=np.float64)
+        return cls(title_bytes, offsets, total, average)
+
+    @classmethod
+    def from_json(cls, filepath):
+        with open(filepath, "r", encoding="utf-8") as file:
+            return cls.from_rows(json.load(file))
+
+    def save(self, directory):
+        return save_columns(directory, {name: getattr(self, name) for name in COLUMNS})
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*load_columns(directory, COLUMNS))
+
+    def __len__(self):
+        return len(self.total)
+
+    def title(self, i):
+        return unpack_title(self.title_bytes, self.title_offsets, i)
+
+    def by_views(self, indices):
+        """Sort row indices by average daily views, highest first."""
+        indices = np.asarray(indices)
+        return indices[np.argsort(-self.average[indices], kind="stable")]
+
+    def threshold(self, min_daily_views):
+        """Rows with more than min_daily_views average daily views, highest first."""
+        return self.by_views(np.flatnonzero(self.average > min_daily_views))
+
+    def top_k(self, k):
+        """The k rows with the most average daily views, highest first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        return self.by_views(np.argpartition(-self.average, k - 1)[:k])
+
+    def stats(self, min_daily_views=None):
+        if len(self) == 0:
+            return {"articles": 0}
+        stats = {
+            "articles": len(self),
+            "total_views": int(self.total.sum()),
+            "mean_daily_views": float(self.average.mean()),
+            "median_daily_views": float(np.median(self.average)),
+            "p90_daily_views": float(np.percentile(self.average, 90)),
+            "max_daily_views": float(self.average.max()),
+        }
+        if min_daily_views is not None:
+            stats["above_threshold"] = int(np.count_nonzero(self.average > min_daily_views))
+        return stats
+
+    def records(self, indices):
+        """Lazily yield {"article", "daily_views"} records for the given rows."""
+        for i in indices:
+            yield {"article": self.title(i), "daily_views": int(round(float(self.average[i])))}
+
+
+def store_dir(category):
+    return os.path.join(PAGEVIEWS_DIR, category)
+
+
+def list_stores():
+    if not os.path.isdir(PAGEVIEWS_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(PAGEVIEWS_DIR)
+        if os.path.isdir(os.path.join(PAGEVIEWS_DIR, name)) and not name.endswith(".tmp")
+    )
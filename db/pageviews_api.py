@@ -0,0 +1,176 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import quote
+from urllib3.util.retry import Retry
+
+# Endpoints, overridable to run against a local stub server
+WIKI_API_URL = os.getenv("WIKI_API_URL", "https://en.wikipedia.org/w/api.php")
+PAGEVIEWS_API_URL = os.getenv("PAGEVIEWS_API_URL", "https://wikimedia.org/api/rest_v1/metrics/pageviews")
+PROJECT = "en.wikipedia"
+
+# Concurrent pageview requests, also the size of the HTTP connection pool
+PAGEVIEWS_WORKERS = int(os.getenv("PAGEVIEWS_WORKERS", "16"))
+REQUEST_TIMEOUT = 30
+# Retries of rate limited (429) and failed (5xx) requests, sleeping PAGEVIEWS_BACKOFF_S * 2^n in between
+PAGEVIEWS_RETRIES = int(os.getenv("PAGEVIEWS_RETRIES", "5"))
+PAGEVIEWS_BACKOFF_S = float(os.getenv("PAGEVIEWS_BACKOFF_S", "1.0"))
+# Wikimedia APIs reject requests without a descriptive User-Agent
+USER_AGENT = os.getenv("WIKI_USER_AGENT", "Capstone_OSU-ingestion/1.0 (https://conspiragen.com)")
+
+CATEGORY_NAMESPACE = 14
+ARTICLE_NAMESPACE = 0
+
+
+def create_session(pool_size: int = PAGEVIEWS_WORKERS) -> requests.Session:
+    """HTTP session with a connection pool sized for the workers and retries for rate limits and server errors."""
+    retry = Retry(
+        total=PAGEVIEWS_RETRIES,
+        backoff_factor=PAGEVIEWS_BACKOFF_S,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def to_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def list_category_members(session: requests.Session, category: str, subcategory_depth: int = 1,
+                          api_url: str = WIKI_API_URL) -> list:
+    """
+    List the article titles in a Wikipedia category, including those in subcategories
+    up to subcategory_depth levels down (the massviews 'subcategories' option).
+    """
+    titles = []
+    seen_titles = set()
+    seen_categories = set()
+    level = [category.replace("_", " ")]
+
+    for depth in range(subcategory_depth + 1):
+        next_level = []
+        for name in level:
+            if name in seen_categories:
+                continue
+            seen_categories.add(name)
+
+            params = {
+                "action": "query",
+                "format": "json",
+                "list": "categorymembers",
+                "cmtitle": f"Category:{name}",
+                "cmnamespace": f"{ARTICLE_NAMESPACE}|{CATEGORY_NAMESPACE}",
+                "cmlimit": "max",
+            }
+            while True:
+                response = session.get(api_url, params=params, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                data = response.json()
+
+                for member in data.get("query", {}).get("categorymembers", []):
+                    title = member["title"]
+                    if member["ns"] == CATEGORY_NAMESPACE:
+                        next_level.append(title.split(":", 1)[1])
+                    elif title not in seen_titles:
+                        seen_titles.add(title)
+                        titles.append(title)
+
+                if "continue" not in data:
+                    break
+                params.update(data["continue"])
+
+        if depth < subcategory_depth:
+            level = next_level
+
+    return titles
+
+
+def fetch_article_views(session: requests.Session, title: str, start, end,
+                        api_url: str = PAGEVIEWS_API_URL) -> int:
+    """Total user pageviews of one article between start and end (inclusive). Returns 0 for unknown pages."""
+    article = quote(title.replace(" ", "_"), safe="")
+    url = (
+        f"{api_url}/per-article/{PROJECT}/all-access/user/{article}/daily/"
+        f"{to_date(start):%Y%m%d}/{to_date(end):%Y%m%d}"
+    )
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 404:
+        return 0
+    response.raise_for_status()
+    return sum(item.get("views", 0) for item in response.json().get("items", []))
+
+
+def fetch_category_pageviews(category: str, start, end, subcategory_depth: int = 1,
+                             workers: int = PAGEVIEWS_WORKERS, wiki_api_url: str = WIKI_API_URL,
+                             pageviews_api_url: str = PAGEVIEWS_API_URL) -> list:
+    """
+    Pageview totals for every article in a category, in the same shape as a massviews
+    JSON export: [{"label": title, "sum": total views, "average": daily average}], sorted by views.
+    """
+    days = (to_date(end) - to_date(start)).days + 1
+    session = create_session(workers)
+    try:
+        titles = list_category_members(session, category, subcategory_depth, wiki_api_url)
+        print(f"Found {len(titles)} articles in \"{category}\"")
+
+        def views_for(title):
+            try:
+                return fetch_article_views(session, title, start, end, pageviews_api_url)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Pageviews request failed for {title}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            totals = list(executor.map(views_for, titles))
+    finally:
+        session.close()
+
+    rows = [
+        {"label": title, "sum": total, "average": total / days}
+        for title, total in zip(titles, totals)
+        if total is not None
+    ]
+    rows.sort(key=lambda row: row["sum"], reverse=True)
+    return rows
+
+
+def fetch_topviews(start, end, api_url: str = PAGEVIEWS_API_URL) -> list:
+    """
+    Most viewed articles over the months from start to end, summed per article:
+    [{"article": title, "views": total views}], sorted by views.
+    """
+    start, end = to_date(start), to_date(end)
+    totals = {}
+    session = create_session(1)
+    try:
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            url = f"{api_url}/top/{PROJECT}/all-access/{year}/{month:02d}/all-days"
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 404:
+                print(f"⚠️ No topviews data for {year}-{month:02d}")
+            else:
+                response.raise_for_status()
+                for item in response.json().get("items", []):
+                    for article in item.get("articles", []):
+                        title = article["article"].replace("_", " ")
+                        totals[title] = totals.get(title, 0) + article.get("views", 0)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    finally:
+        session.close()
+
+    return [
+        {"article": title, "views": views}
+        for title, views in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    ]
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a pipeline: fn(item) returns the item for the next stage, or None to drop it.
+    `workers` threads run the stage at the same time.
+    """
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+
+
+def run_pipeline(items, stages, queue_size=2):
+    """
+    Runs every item through the stages in order. Stages are connected by bounded queues,
+    so a slow stage makes earlier ones wait instead of piling up finished work, and
+    different items are in different stages at the same time.
+    Returns the outputs of the last stage.
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages] + [queue.Queue()]
+    lock = threading.Lock()
+    remaining_workers = [stage.workers for stage in stages]
+
+    def work(index):
+        stage = stages[index]
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            start = time.monotonic()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed for {item}: {e}")
+                result = None
+            elapsed = time.monotonic() - start
+
+            with lock:
+                stage.busy_time += elapsed
+                if result is None:
+                    stage.failed += 1
+                else:
+                    stage.processed += 1
+            if result is not None:
+                outbox.put(result)
+
+        # The last worker of a stage tells every worker of the next stage to stop
+        with lock:
+            remaining_workers[index] -= 1
+            last = remaining_workers[index] == 0
+        if last:
+            next_workers = stages[index + 1].workers if index + 1 < len(stages) else 1
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    threads = []
+    for index, stage in enumerate(stages):
+        for n in range(stage.workers):
+            thread = threading.Thread(target=work, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    start = time.monotonic()
+    for item in items:
+        queues[0].put(item)
+    for _ in range(stages[0].workers):
+        queues[0].put(_DONE)
+
+    for thread in threads:
+        thread.join()
+    wall_time = time.monotonic() - start
+
+    results = []
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        results.append(item)
+
+    print(f"Pipeline finished in {wall_time:.1f}s")
+    for stage in stages:
+        print(f" - {stage.name}: {stage.processed} done, {stage.failed} dropped, "
+              f"{stage.busy_time:.1f}s busy across {stage.workers} worker(s)")
+    return results
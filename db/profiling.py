@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from structured_log import get_logger, current_request, active_requests
+
+log = get_logger("profiling")
+
+# /debug/profile is disabled unless a token is set; callers send it in the X-Profile-Token header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Requests slower than this get their sampled stacks and ES queries dumped to PROFILES_DIR (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_INTERVAL_MS = float(os.getenv("SLOW_REQUEST_INTERVAL_MS", "10"))
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/profiles"))
+# Oldest dumps are deleted beyond this many
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", "200"))
+# Events of one kind kept per request
+MAX_RECORDS = 200
+
+
+def frame_stack(frame) -> str:
+    """One stack in collapsed format, outermost call first: "file.py:func;file.py:func"."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def collapse(counts: Counter) -> str:
+    """Collapsed stack lines ("stack count"), the input format of flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+_profile_lock = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS) -> Counter:
+    """
+    Samples the stacks of every thread except the caller for `seconds`.
+    Stacks are prefixed with the thread name. Returns None if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        own = threading.get_ident()
+        counts = Counter()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    counts[f"{names.get(ident, ident)};{frame_stack(frame)}"] += 1
+            time.sleep(interval_ms / 1000)
+        return counts
+    finally:
+        _profile_lock.release()
+
+
+def record_es_query(kind: str, body):
+    """Keep an ES request of the current request for its slow request dump."""
+    if not SLOW_REQUEST_MS:
+        return
+    context = current_request()
+    if context is not None:
+        context.record("es_queries", {"at_ms": round((time.monotonic() - context.start) * 1000, 1),
+                                      "kind": kind, "body": body}, MAX_RECORDS)
+
+
+# Samples the threads working for each in-flight request into that request's "stacks" record.
+# Only request threads are looked at, so idle pools and the sampler itself cost nothing.
+def _sample_requests():
+    while True:
+        time.sleep(SLOW_REQUEST_INTERVAL_MS / 1000)
+        contexts = active_requests()
+        if not contexts:
+            continue
+        frames = sys._current_frames()
+        for context in contexts:
+            stacks = [frame_stack(frames[ident]) for ident in context.thread_idents() if ident in frames]
+            context.tally("stacks", stacks)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def start_slow_request_sampler():
+    global _sampler
+    if not SLOW_REQUEST_MS:
+        return
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_requests, name="request-sampler", daemon=True)
+            _sampler.start()
+
+
+def dump_if_slow(context, summary: dict):
+    """Writes the request's stacks and ES queries to PROFILES_DIR if it was slow. Returns the file path or None."""
+    if not SLOW_REQUEST_MS or summary.get("duration_ms", 0) < SLOW_REQUEST_MS:
+        return None
+    stacks = Counter(context.get_records("stacks", {}))
+    profile = {
+        "summary": summary,
+        "interval_ms": SLOW_REQUEST_INTERVAL_MS,
+        "collapsed_stacks": collapse(stacks),
+        "es_queries": context.get_records("es_queries", []),
+    }
+    try:
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = os.path.join(PROFILES_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{context.request_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, default=str)
+        _prune()
+        return path
+    except OSError as e:
+        log.warning("⚠️ Could not write slow request profile: %s", e)
+        return None
+
+
+def _prune():
+    files = sorted(name for name in os.listdir(PROFILES_DIR) if name.endswith(".json"))
+    for name in files[:-PROFILES_KEEP] if PROFILES_KEEP > 0 else []:
+        os.remove(os.path.join(PROFILES_DIR, name))
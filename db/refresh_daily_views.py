@@ -0,0 +1,98 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import requests
+from elasticsearch import helpers
+from elasticsearch_import import INDEX_NAME, wait_for_es, update_fields
+from es_client import BULK, get_client
+from pageviews_api import create_session, fetch_article_views, PAGEVIEWS_WORKERS
+from pageview_store import PageviewStore, store_dir, list_stores
+from download_wiki_articles import DEDUP_VIEWS_MODE
+
+# Pageviews are averaged over this many days, ending yesterday
+REFRESH_WINDOW_DAYS = int(os.getenv("REFRESH_WINDOW_DAYS", "365"))
+
+def indexed_views(es, index_name=INDEX_NAME):
+    """Current daily_views of every imported article (_id -> views), without loading article text."""
+    views = {}
+    for hit in helpers.scan(es, index=index_name, query={"query": {"match_all": {}}}, _source=["daily_views"]):
+        value = hit["_source"].get("daily_views")
+        # Documents added by the Wikipedia API fallback have no pageview data
+        if isinstance(value, int) and value >= 0:
+            views[hit["_id"]] = value
+    return views
+
+def views_from_api(titles, days=REFRESH_WINDOW_DAYS, workers=PAGEVIEWS_WORKERS):
+    """Fresh average daily views for each title from the Wikimedia pageviews API."""
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+    session = create_session(workers)
+
+    def average(title):
+        try:
+            return round(fetch_article_views(session, title, start, end) / days)
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ Pageviews request failed for {title}: {e}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            averages = list(executor.map(average, titles))
+    finally:
+        session.close()
+    return {title: views for title, views in zip(titles, averages) if views is not None}
+
+def views_from_stores(views_mode=DEDUP_VIEWS_MODE):
+    """Average daily views per title from the downloaded pageview stores, merged across categories."""
+    views = {}
+    for category in list_stores():
+        store = PageviewStore.load(store_dir(category))
+        for record in store.records(range(len(store))):
+            title = record["article"].replace("_", " ")
+            if views_mode == "sum":
+                views[title] = views.get(title, 0) + record["daily_views"]
+            else:
+                views[title] = max(views.get(title, 0), record["daily_views"])
+    return views
+
+def refresh(source="api", min_change=0, dry_run=False):
+    es = get_client(BULK)
+    current = indexed_views(es)
+    print(f"📂 {len(current)} articles with pageview data in '{INDEX_NAME}'")
+
+    if source == "stores":
+        fresh = views_from_stores()
+    else:
+        fresh = views_from_api(list(current))
+
+    # Only documents whose value actually changed are sent, as partial updates of daily_views
+    updates = {
+        doc_id: {"daily_views": fresh[doc_id]}
+        for doc_id, views in current.items()
+        if doc_id in fresh and abs(fresh[doc_id] - views) > min_change
+    }
+    print(f"📊 {len(fresh)} fresh values, {len(updates)} changed, "
+          f"{len(current) - len(updates)} unchanged or unavailable")
+
+    if dry_run or not updates:
+        return updates
+    update_fields(updates, es=es)
+    return updates
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Refresh daily_views in Elasticsearch without reimporting articles")
+    parser.add_argument("--source", choices=["api", "stores"], default="api",
+                        help="api: fetch fresh pageviews for every indexed article, "
+                             "stores: use the pageview stores from the last massviews download")
+    parser.add_argument("--min-change", type=int, default=0,
+                        help="only update documents whose daily_views changed by more than this")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without writing them")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("Starting daily_views refresh...")
+    wait_for_es()  # Ensure Elasticsearch is running
+    refresh(args.source, args.min_change, args.dry_run)
+    print("daily_views refresh completed.")
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from column_store import META_FILE, pack_titles, unpack_title, save_columns, load_columns, load_meta
+from structured_log import get_logger
+
+log = get_logger("related_index")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+ARTICLES_DIR = os.path.join(DATA_DIR, "articles")
+# Precomputed nearest neighbours of every corpus article, built offline by `python3 related_index.py build`
+RELATED_INDEX_DIR = os.getenv("RELATED_INDEX_DIR", os.path.join(DATA_DIR, "related"))
+
+# Hashed term vector size, dimensions kept by the SVD and neighbours stored per article
+RELATED_FEATURES = 2 ** 18
+RELATED_SVD_DIMS = int(os.getenv("RELATED_SVD_DIMS", "128"))
+RELATED_NEIGHBOURS = int(os.getenv("RELATED_NEIGHBOURS", "50"))
+# Title terms count this many times more than body terms
+TITLE_WEIGHT = 3
+# Articles compared at once when computing neighbours (block size x articles similarity matrix)
+SIMILARITY_BLOCK = 256
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{3,}")
+COLUMNS = ("title_bytes", "title_offsets", "key_hashes", "key_rows", "neighbours", "scores")
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(title.replace("_", " ").lower().split())
+
+
+def title_key(title: str) -> int:
+    # 64-bit key that is stable across processes, unlike hash()
+    encoded = normalize_title(title).encode("utf-8")
+    return zlib.crc32(encoded) << 32 | zlib.adler32(encoded)
+
+
+def load_articles(data_folder=ARTICLES_DIR) -> list:
+    """Every article in the corpus files, deduplicated by title."""
+    articles = {}
+    for filename in sorted(os.listdir(data_folder)):
+        if filename.endswith(".json"):
+            with open(os.path.join(data_folder, filename), "r", encoding="utf-8") as f:
+                for article in json.load(f):
+                    if article.get("title"):
+                        articles[article["title"]] = article
+    return list(articles.values())
+
+
+def term_matrix(articles: list) -> sparse.csr_matrix:
+    """TF-IDF weighted hashed term vectors (one L2-normalized row per article)."""
+    indptr = [0]
+    indices = []
+    data = []
+    for article in articles:
+        counts = {}
+        text = f"{article['title']} " * TITLE_WEIGHT + (article.get("wikipedia_content") or "")
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            feature = zlib.crc32(token.encode("utf-8")) % RELATED_FEATURES
+            counts[feature] = counts.get(feature, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(articles), RELATED_FEATURES)
+    )
+    # Sublinear term frequency times smoothed inverse document frequency
+    matrix.data = 1 + np.log(matrix.data)
+    document_frequency = np.bincount(matrix.indices, minlength=RELATED_FEATURES)
+    idf = np.log((1 + len(articles)) / (1 + document_frequency)) + 1
+    matrix = matrix.multiply(idf.astype(np.float32)).tocsr()
+    return normalize_rows(matrix)
+
+
+def normalize_rows(matrix):
+    if sparse.issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).dot(matrix).tocsr()
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def nearest_neighbours(vectors: np.ndarray, k: int):
+    """Top k most similar other articles of every article (indices and cosine similarities), best first."""
+    count = len(vectors)
+    k = min(k, count - 1)
+    neighbours = np.zeros((count, k), dtype=np.int32)
+    scores = np.zeros((count, k), dtype=np.float16)
+    for start in range(0, count, SIMILARITY_BLOCK):
+        end = min(start + SIMILARITY_BLOCK, count)
+        similarity = vectors[start:end] @ vectors.T
+        similarity[np.arange(end - start), np.arange(start, end)] = -np.inf  # Not its own neighbour
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbours[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbours, scores
+
+
+class RelatedIndex:
+    """
+    Precomputed related articles of every corpus article, stored as NumPy columns:
+    - title_bytes / title_offsets: UTF-8 titles packed into one byte array
+    - key_hashes / key_rows: sorted title hashes and their rows, to find an article without decoding every title
+    - neighbours / scores: the row numbers and cosine similarities of each article's nearest neighbours
+    Loaded indexes are memory-mapped, so every API worker shares the same pages.
+    """
+
+    def __init__(self, title_bytes, title_offsets, key_hashes, key_rows, neighbours, scores, meta=None):
+        self.title_bytes = title_bytes
+        self.title_offsets = title_offsets
+        self.key_hashes = key_hashes
+        self.key_rows = key_rows
+        self.neighbours = neighbours
+        self.scores = scores
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, articles: list, dims=RELATED_SVD_DIMS, k=RELATED_NEIGHBOURS):
+        if len(articles) < 3:
+            raise ValueError("At least 3 articles are needed to build a related article index")
+        start = time.monotonic()
+        titles = [article["title"] for article in articles]
+        matrix = term_matrix(articles)
+
+        # Truncated SVD of the term matrix: articles sharing related terms end up close together
+        dims = max(1, min(dims, min(matrix.shape) - 1))
+        u, s, _ = svds(matrix, k=dims, random_state=0)
+        vectors = normalize_rows((u * s).astype(np.float32))
+        neighbours, scores = nearest_neighbours(vectors, k)
+
+        title_bytes, offsets = pack_titles(titles)
+        keys = np.array([title_key(title) for title in titles], dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+
+        meta = {
+            "articles": len(titles),
+            "dims": dims,
+            "neighbours": int(neighbours.shape[1]),
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "build_seconds": round(time.monotonic() - start, 1),
+        }
+        return cls(
+            title_bytes, offsets,
+            keys[order], order.astype(np.int32), neighbours, scores, meta
+        )
+
+    def save(self, directory=RELATED_INDEX_DIR):
+        return save_columns(directory, {name: getattr(self, name) for name in COLUMNS}, self.meta)
+
+    @classmethod
+    def load(cls, directory=RELATED_INDEX_DIR):
+        return cls(*load_columns(directory, COLUMNS), meta=load_meta(directory))
+
+    def __len__(self):
+        return len(self.title_offsets) - 1
+
+    def title(self, row: int) -> str:
+        return unpack_title(self.title_bytes, self.title_offsets, row)
+
+    def row(self, title: str):
+        """Row of an article by title (case and underscore insensitive), or None if it is not in the index."""
+        key = title_key(title)
+        i = int(np.searchsorted(self.key_hashes, key))
+        while i < len(self.key_hashes) and self.key_hashes[i] == key:
+            row = int(self.key_rows[i])
+            if normalize_title(self.title(row)) == normalize_title(title):
+                return row
+            i += 1
+        return None
+
+    def related(self, title: str, limit: int = 10) -> list:
+        """The most related articles as [(title, similarity)], or None if the article is not in the index."""
+        row = self.row(title)
+        if row is None:
+            return None
+        return [(self.title(int(n)), float(s)) for n, s in zip(self.neighbours[row, :limit], self.scores[row, :limit])]
+
+    def bridges(self, title1: str, title2: str, limit: int = 10, exclude=()) -> list:
+        """
+        Articles related to both titles as [(title, score)], best first. The score adds the
+        similarities to each title, so articles close to both rank above those close to one.
+        Returns None if either title is not in the index.
+        """
+        row1, row2 = self.row(title1), self.row(title2)
+        if row1 is None or row2 is None:
+            return None
+        combined = {}
+        for row in (row1, row2):
+            for n, s in zip(self.neighbours[row], self.scores[row]):
+                combined[int(n)] = combined.get(int(n), 0.0) + float(s)
+        excluded = {normalize_title(t) for t in exclude} | {normalize_title(title1), normalize_title(title2)}
+        ranked = sorted(combined.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for row, score in ranked:
+            title = self.title(row)
+            if normalize_title(title) in excluded:
+                continue
+            results.append((title, score))
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_related_index(directory=RELATED_INDEX_DIR):
+    """The shared related article index, reloaded when a new build replaces it. None if not built."""
+    global _index, _index_mtime
+    meta_path = os.path.join(directory, META_FILE)
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            try:
+                _index = RelatedIndex.load(directory)
+                _index_mtime = mtime
+                log.info("✅ Loaded related article index", extra={"index": _index.meta})
+            except (OSError, ValueError) as e:
+                log.warning("⚠️ Could not load related article index: %s", e)
+                return None
+        return _index
+
+
+def build_related_index(data_folder=ARTICLES_DIR, directory=RELATED_INDEX_DIR):
+    articles = load_articles(data_folder)
+    print(f"Building related article index for {len(articles)} articles...")
+    index = RelatedIndex.build(articles)
+    index.save(directory)
+    print(f"✅ Related article index written to {directory}: {json.dumps(index.meta)}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the related article index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the index from data/articles")
+    build_parser.add_argument("--data-folder", default=ARTICLES_DIR)
+    query_parser = subparsers.add_parser("related", help="Print the related articles of one or two titles")
+    query_parser.add_argument("titles", nargs="+")
+    query_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_related_index(args.data_folder)
+    else:
+        index = get_related_index()
+        if index is None:
+            raise SystemExit(f"No related article index in {RELATED_INDEX_DIR}, run `python3 related_index.py build`")
+        if len(args.titles) >= 2:
+            results = index.bridges(args.titles[0], args.titles[1], args.limit)
+        else:
+            results = index.related(args.titles[0], args.limit)
+        for title, score in results or []:
+            print(f"{score:.3f}  {title}")
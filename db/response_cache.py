@@ -0,0 +1,78 @@
+import os
+import threading
+from deadline import Deadline
+from es_gen_models import normalize_topic, searchV3, SHALLOW_SEARCH_FRACTION
+from http_cache import make_etag
+from structured_log import get_logger, current_request
+from ttl_cache import TTLCache, CACHE_DIR
+
+log = get_logger("response_cache")
+
+# Server side cache of /generate results, shared by the API workers and warm_cache.py through SQLite.
+# Searches (the articles found for a query) and generations (whole responses) are kept apart,
+# so a query whose search is cached only needs the Gemini call.
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", str(24 * 60 * 60)))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "5000"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(CACHE_DIR, "responses.sqlite"))
+# Entries hold whole articles, so fewer are kept in memory than in the default TTLCache
+RESPONSE_CACHE_MEMORY_SIZE = 200
+
+# Articles per /generate story
+ARTICLE_LIMIT = 5
+
+searches = TTLCache(RESPONSE_CACHE_PATH, "searches", RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_SIZE, RESPONSE_CACHE_MEMORY_SIZE)
+generations = TTLCache(RESPONSE_CACHE_PATH, "generations", RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_SIZE, RESPONSE_CACHE_MEMORY_SIZE)
+
+
+def response_key(keywords: list, search: dict, version: str) -> str:
+    """Cache key (and ETag) of a /generate response: the same for the same keywords and search settings on the same index."""
+    return make_etag("generate", [normalize_topic(k) for k in keywords], search, version)
+
+
+class CacheStats:
+    """How /generate requests of this process were answered: "generation", "search" (Gemini only) or "miss"."""
+
+    def __init__(self):
+        self.counts = {"generation": 0, "search": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+        context = current_request()
+        if context is not None:
+            context.set(cache=outcome)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        hits = counts["generation"] + counts["search"]
+        return {**counts, "hit_rate": round(hits / total, 3) if total else None}
+
+
+stats = CacheStats()
+
+
+def is_cacheable_generation(output: dict) -> bool:
+    """Only successful stories are cached, Gemini errors are returned as text."""
+    text = (output or {}).get("generated_conspiracy") or ""
+    return bool(text) and not text.startswith(("Error:", "❌"))
+
+
+def cached_search(es, connected, keywords: list, search: dict, key: str = None, deadline: Deadline = None):
+    """
+    searchV3 through the search cache (skipped when key is None), returns (wiki data, whether it was cached).
+    Searches that ran with less than half the request budget may have been cut short, so they are not cached.
+    Raises SearchError.
+    """
+    deadline = deadline or Deadline()
+    if key:
+        wiki_data = searches.get(key)
+        if wiki_data is not None:
+            return wiki_data, True
+
+    wiki_data = searchV3(es, connected, keywords, ARTICLE_LIMIT, deadline, search)
+    if key and deadline.fraction_left() >= SHALLOW_SEARCH_FRACTION:
+        searches.set(key, wiki_data)
+    return wiki_data, False
@@ -0,0 +1,246 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+# Level for events outside sampled requests: DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+# Fraction of requests whose debug events are logged, e.g. 0.01 for one request in a hundred
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0"))
+# "json" for one JSON object per line, "text" for readable lines during development
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+LOGGER_NAME = "conspiragen"
+
+# Caller supplied X-Request-IDs end up in every log line and in profile dump file names
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+# Attributes every LogRecord has, anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class RequestContext:
+    """
+    Correlation ID, debug sampling decision and counters of one request, shared by its worker threads.
+    `threads` holds the idents of the threads currently working for the request (see submit) and
+    `records` lists of events kept for a slow request dump (see profiling.py).
+    """
+
+    def __init__(self, request_id=None, sample_debug=None):
+        if not (isinstance(request_id, str) and _REQUEST_ID.fullmatch(request_id)):
+            request_id = uuid.uuid4().hex[:16]
+        self.request_id = request_id
+        self.sample_debug = random.random() < LOG_DEBUG_SAMPLE_RATE if sample_debug is None else sample_debug
+        self.start = time.monotonic()
+        self.fields = {}
+        self.threads = {threading.get_ident()}
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def add_thread(self, ident):
+        with self._lock:
+            self.threads.add(ident)
+
+    def remove_thread(self, ident):
+        with self._lock:
+            self.threads.discard(ident)
+
+    def thread_idents(self) -> list:
+        with self._lock:
+            return list(self.threads)
+
+    def record(self, name, item, limit):
+        """Append to a named list of events, keeping at most `limit` of them."""
+        with self._lock:
+            items = self.records.setdefault(name, [])
+            if len(items) < limit:
+                items.append(item)
+
+    def tally(self, name, keys):
+        """Count each of `keys` in a named dict of event counts."""
+        with self._lock:
+            counts = self.records.setdefault(name, {})
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+
+    def get_records(self, name, default=None):
+        """A copy of a named record, safe to read while other threads keep adding to it."""
+        with self._lock:
+            value = self.records.get(name, default)
+            return value.copy() if value is not None else None
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.fields[name] = self.fields.get(name, 0) + n
+
+    def timing(self, name, seconds):
+        with self._lock:
+            self.fields[f"{name}_ms"] = round(self.fields.get(f"{name}_ms", 0) + seconds * 1000, 1)
+
+    def set(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+
+    def summary(self, **fields):
+        with self._lock:
+            return {
+                "request_id": self.request_id,
+                "duration_ms": round((time.monotonic() - self.start) * 1000, 1),
+                **self.fields,
+                **fields,
+            }
+
+
+_current = contextvars.ContextVar("request_context", default=None)
+_active = set()
+_active_lock = threading.Lock()
+
+
+def current_request():
+    return _current.get()
+
+
+def active_requests() -> list:
+    with _active_lock:
+        return list(_active)
+
+
+def start_request(request_id=None) -> contextvars.Token:
+    context = RequestContext(request_id)
+    with _active_lock:
+        _active.add(context)
+    return _current.set(context)
+
+
+def end_request(token: contextvars.Token):
+    with _active_lock:
+        _active.discard(_current.get())
+    _current.reset(token)
+
+
+def count(name, n=1):
+    """Add to a counter of the current request's summary line (no-op outside a request)."""
+    context = _current.get()
+    if context is not None:
+        context.count(name, n)
+
+
+def timing(name, seconds):
+    """Add to a duration of the current request's summary line (no-op outside a request)."""
+    context = _current.get()
+    if context is not None:
+        context.timing(name, seconds)
+
+
+def _run_for_request(fn, *args, **kwargs):
+    context = _current.get()
+    if context is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    context.add_thread(ident)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        context.remove_thread(ident)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that runs fn with the caller's request context, so its logs keep the request ID."""
+    return executor.submit(contextvars.copy_context().run, _run_for_request, fn, *args, **kwargs)
+
+
+class _RequestQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without formatting them. Only the request ID is
+    attached here, since it lives in the calling thread's context.
+    """
+
+    def prepare(self, record):
+        context = _current.get()
+        record.request_id = context.request_id if context else None
+        if record.exc_info and not record.exc_text:
+            # Tracebacks must be rendered before the frames go away
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _DebugSampler(logging.Filter):
+    """Drops events below LOG_LEVEL unless the current request was picked for debug sampling."""
+
+    def filter(self, record):
+        if record.levelno >= LOG_LEVEL:
+            return True
+        context = _current.get()
+        return context is not None and context.sample_debug
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            line["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                line[key] = value
+        if record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{record.levelname[0]} {record.getMessage()}"
+        extra = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if extra:
+            line = f"{line} {extra}"
+        if record.request_id:
+            line = f"[{record.request_id}] {line}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging():
+    """Route every logger under LOGGER_NAME through a queue to one writer thread. Safe to call more than once."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, output)
+        _listener.start()
+
+        handler = _RequestQueueHandler(log_queue)
+        handler.addFilter(_DebugSampler())
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.addHandler(handler)
+        logger.propagate = False
+        # Debug events are only created when some requests can be sampled
+        logger.setLevel(logging.DEBUG if LOG_DEBUG_SAMPLE_RATE > 0 else LOG_LEVEL)
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
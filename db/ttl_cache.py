@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from structured_log import get_logger
+
+log = get_logger("cache")
+
+# Runtime directory of the SQLite cache files, kept out of the source tree in deployments
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/cache"))
+
+
+class TTLCache:
+    """
+    Bounded key -> JSON value cache with a time to live.
+    Entries live in an in-process LRU map and, when a path is given, in a small
+    SQLite file so every API worker process on the host shares them.
+    The file is opened on first use, so importing a module that defines a cache touches no disk.
+    If the SQLite store cannot be used the cache keeps working in memory only.
+    """
+
+    def __init__(self, path: str, table: str, ttl: float, max_size: int = 10000, memory_size: int = 1000):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_size = max_size
+        self.memory_size = memory_size
+
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._opened = False
+
+    def _persistent(self) -> bool:
+        """Creates the SQLite file and table on first use. False when the cache is memory only."""
+        if self._opened or not self.path:
+            return bool(self.path)
+        with self._lock:
+            if not self._opened and self.path:
+                try:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self._db().execute(
+                        f"CREATE TABLE IF NOT EXISTS {self.table} "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                    )
+                except (OSError, sqlite3.Error) as e:
+                    log.warning("⚠️ Cache '%s' falling back to memory only: %s", self.table, e)
+                    self.path = None
+                self._opened = True
+        return bool(self.path)
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread, sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Returns the cached value, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    return entry[0]
+                del self._memory[key]
+
+        if not self._persistent():
+            return None
+        try:
+            row = self._db().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("⚠️ Cache '%s' read failed: %s", self.table, e)
+            return None
+        if row is None or row[1] <= now:
+            return None
+
+        value = json.loads(row[0])
+        self._remember(key, value, row[1])
+        return value
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._remember(key, value, expires_at)
+        if not self._persistent():
+            return
+        try:
+            db = self._db()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(db)
+        except sqlite3.Error as e:
+            log.warning("⚠️ Cache '%s' write failed: %s", self.table, e)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        if not self._persistent():
+            return
+        try:
+            self._db().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            log.warning("⚠️ Cache '%s' delete failed: %s", self.table, e)
+
+    def _prune(self, db: sqlite3.Connection):
+        # Drop expired entries, then the ones closest to expiry beyond max_size
+        db.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+        db.execute(
+            f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+            "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+
+    def __len__(self):
+        if not self._persistent():
+            return len(self._memory)
+        try:
+            return self._db().execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return len(self._memory)
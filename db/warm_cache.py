@@ -0,0 +1,176 @@
+"""
+Fills the /generate response cache (see response_cache.py) ahead of traffic, so popular keyword
+pairs are answered from cache from the first request on. Pairs come from the most viewed articles
+in data/topviews.json (see download_topviews.py) and from the current and next /samples lists.
+Every pair gets its keyword resolution and path search cached; with a Gemini quota, the best
+ranked pairs also get a whole story. Meant to run off-peak, e.g. from cron:
+
+    docker compose -f compose.prod.yml run --rm warm-cache
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+import google.generativeai as genai
+from elasticsearch_import import INDEX_NAME, wait_for_es
+from es_client import get_client
+from es_gen_models import get_search_settings, gem_consp, gen_output, sample_titles, SearchError
+from http_cache import index_version, samples_seed, SAMPLES_CACHE_MAX_AGE
+from response_cache import searches, generations, response_key, cached_search, is_cacheable_generation
+
+TOPVIEWS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/topviews.json")
+# Most viewed articles (that are in the index) paired with each other
+WARM_TOP_ARTICLES = int(os.getenv("WARM_TOP_ARTICLES", "30"))
+# Upper bound of pairs warmed per run, topviews pairs first
+WARM_MAX_PAIRS = int(os.getenv("WARM_MAX_PAIRS", "1000"))
+# Gemini stories generated per run, 0 only caches the searches
+WARM_GEMINI_QUOTA = int(os.getenv("WARM_GEMINI_QUOTA", "0"))
+# Hours of the day (container time, "start-end") the job may run in, e.g. "1-6"; empty for any time
+WARM_CACHE_HOURS = os.getenv("WARM_CACHE_HOURS", "")
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Topviews entries that are not articles
+EXCLUDED_TITLES = {"Main Page", "-"}
+# Titles per mget when checking which popular articles are indexed
+LOOKUP_BATCH = 500
+
+
+def in_warm_hours(hours: str = WARM_CACHE_HOURS, now: datetime = None) -> bool:
+    if not hours:
+        return True
+    start, end = (int(h) for h in hours.split("-"))
+    hour = (now or datetime.now()).hour
+    # A window like "22-4" wraps around midnight
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def popular_titles(es, limit: int, path: str = TOPVIEWS_FILE) -> list:
+    """The `limit` most viewed articles of the topviews download that are in the index, as [(title, views)]."""
+    with open(path, "r", encoding="utf-8") as f:
+        topviews = [a for a in json.load(f) if a["article"] not in EXCLUDED_TITLES and ":" not in a["article"]]
+
+    found = []
+    for start in range(0, len(topviews), LOOKUP_BATCH):
+        batch = topviews[start:start + LOOKUP_BATCH]
+        response = es.mget(index=INDEX_NAME, ids=[a["article"] for a in batch], _source=False)
+        found.extend((a["article"], a["views"]) for a, doc in zip(batch, response["docs"]) if doc.get("found"))
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def topviews_pairs(titles: list) -> list:
+    """Every ordered pair of the titles, the pairs of the most viewed articles first."""
+    pairs = [(a, b, views_a * views_b) for a, views_a in titles for b, views_b in titles if a != b]
+    pairs.sort(key=lambda pair: pair[2], reverse=True)
+    return [(a, b) for a, b, _ in pairs]
+
+
+def samples_pairs(es, windows: int = 2) -> list:
+    """
+    Ordered pairs of the /samples lists of the current and next windows, shuffled. The page picks two
+    random samples, so this only pays off when SAMPLES_CACHE_MAX_AGE is hours rather than a minute.
+    """
+    pairs = []
+    for i in range(windows):
+        seed = samples_seed(time.time() + i * SAMPLES_CACHE_MAX_AGE)
+        titles = sample_titles(es, seed)
+        window = [(a, b) for a in titles for b in titles if a != b]
+        random.Random(seed).shuffle(window)
+        pairs.extend(window)
+    return pairs
+
+
+def warm(es, pairs: list, search: dict, version: str, gemini_quota: int = WARM_GEMINI_QUOTA, hours: str = WARM_CACHE_HOURS) -> dict:
+    """
+    Caches the search (and, within the quota, the story) of each (source, title1, title2), stopping
+    once outside of `hours`. Returns per source the number of pairs, those already cached before and those cached after.
+    """
+    report = {}
+    gemini_calls = 0
+    stories = 0
+    for source, title1, title2 in pairs:
+        if not in_warm_hours(hours):
+            print(f"⏱️ Outside of WARM_CACHE_HOURS ({hours}), stopping")
+            break
+        counts = report.setdefault(source, {"pairs": 0, "cached_before": 0, "cached_after": 0, "no_path": 0})
+        counts["pairs"] += 1
+
+        keywords = [title1, title2]
+        key = response_key(keywords, search, version)
+        has_story = generations.get(key) is not None
+        wiki_data = None if has_story else searches.get(key)
+        if has_story or wiki_data is not None:
+            counts["cached_before"] += 1
+
+        try:
+            if not has_story and wiki_data is None:
+                wiki_data, _ = cached_search(es, True, keywords, search, key)
+            if not has_story and gemini_calls < gemini_quota:
+                gemini_calls += 1
+                output = gen_output(keywords, gem_consp(GEMINI_API_KEY, keywords, wiki_data), wiki_data)
+                if is_cacheable_generation(output):
+                    generations.set(key, output)
+                    stories += 1
+        except SearchError:
+            counts["no_path"] += 1
+            continue
+        counts["cached_after"] += 1
+
+    report["gemini"] = {"calls": gemini_calls, "quota": gemini_quota, "stories": stories}
+    return report
+
+
+def print_report(report: dict, seconds: float):
+    print(f"📊 Cache warm-up finished in {seconds:.0f}s")
+    for source, counts in report.items():
+        if source == "gemini":
+            continue
+        pairs = counts["pairs"] or 1
+        print(f"   {source}: {counts['pairs']} pairs, hit rate before warming "
+              f"{counts['cached_before'] / pairs:.1%}, coverage now {counts['cached_after'] / pairs:.1%} "
+              f"({counts['no_path']} without a result)")
+    gemini = report["gemini"]
+    print(f"   gemini: {gemini['calls']} of {gemini['quota']} calls used, {gemini['stories']} stories cached")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-articles", type=int, default=WARM_TOP_ARTICLES)
+    parser.add_argument("--max-pairs", type=int, default=WARM_MAX_PAIRS)
+    parser.add_argument("--gemini-quota", type=int, default=WARM_GEMINI_QUOTA)
+    parser.add_argument("--sample-windows", type=int, default=2,
+                        help="/samples windows (current and following) whose pairs are warmed, 0 to skip")
+    parser.add_argument("--mode", help="search mode to warm, defaults to SEARCH_MODE")
+    parser.add_argument("--force", action="store_true", help="run outside of WARM_CACHE_HOURS")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.force and not in_warm_hours():
+        raise SystemExit(f"Outside of WARM_CACHE_HOURS ({WARM_CACHE_HOURS}), use --force to run anyway")
+
+    print("Starting response cache warm-up...")
+    wait_for_es()
+    es = get_client()
+    if args.gemini_quota and GEMINI_API_KEY:
+        genai.configure(api_key=GEMINI_API_KEY)
+
+    version, _ = index_version(es)
+    if version is None:
+        raise SystemExit("❌ Could not read the index version")
+    search = get_search_settings(args.mode)
+
+    pairs = []
+    if os.path.exists(TOPVIEWS_FILE):
+        pairs.extend(("topviews", a, b) for a, b in topviews_pairs(popular_titles(es, args.top_articles)))
+    else:
+        print(f"⚠️ {TOPVIEWS_FILE} not found, run download_topviews.py first. Only warming /samples pairs")
+    pairs.extend(("samples", a, b) for a, b in samples_pairs(es, args.sample_windows))
+
+    start = time.monotonic()
+    report = warm(es, pairs[:args.max_pairs], search, version, args.gemini_quota, "" if args.force else WARM_CACHE_HOURS)
+    print_report(report, time.monotonic() - start)
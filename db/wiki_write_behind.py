@@ -0,0 +1,142 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from elasticsearch import Elasticsearch, helpers
+from es_client import BULK, get_client
+from structured_log import get_logger
+
+log = get_logger("write_behind")
+
+# Flush when this many documents are waiting, or when the oldest has waited this long
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_S = float(os.getenv("WRITE_BEHIND_FLUSH_S", "2"))
+# How long fetched documents are served from memory. This covers the flush
+# interval plus the ES refresh interval, after which the document is searchable.
+RECENT_TTL_S = float(os.getenv("WRITE_BEHIND_RECENT_TTL_S", "60"))
+RECENT_MAX_SIZE = 1000
+
+
+class WriteBehindQueue:
+    """
+    Collects documents fetched from the Wikipedia API and upserts them into
+    Elasticsearch in bulk from a background thread, off the request path.
+    Queued and recently written documents can be read back with get_recent().
+    """
+
+    def __init__(self, es: Elasticsearch, index="wikipedia", batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval=WRITE_BEHIND_FLUSH_S, recent_ttl=RECENT_TTL_S, recent_max_size=RECENT_MAX_SIZE):
+        self.es = es
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent_ttl = recent_ttl
+        self.recent_max_size = recent_max_size
+
+        self._queue = queue.Queue()
+        self._recent = OrderedDict()  # _id -> (doc, time added)
+        self._recent_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="wiki-write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, doc_id: str, doc: dict):
+        """Queue a document for upsert and make it readable right away."""
+        with self._recent_lock:
+            self._recent[doc_id] = (doc, time.monotonic())
+            self._recent.move_to_end(doc_id)
+            while len(self._recent) > self.recent_max_size:
+                self._recent.popitem(last=False)
+        self._queue.put((doc_id, doc))
+
+    def get_recent(self, doc_id: str):
+        """Returns the document if it was fetched within the last recent_ttl seconds."""
+        with self._recent_lock:
+            entry = self._recent.get(doc_id)
+            if entry is None:
+                return None
+            doc, added = entry
+            if time.monotonic() - added > self.recent_ttl:
+                del self._recent[doc_id]
+                return None
+            return doc
+
+    def _drain(self, first=None) -> list:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        if not batch:
+            return
+        # Later fetches of the same topic replace earlier ones
+        docs = dict(batch)
+        actions = [
+            {
+                "_op_type": "update",
+                "_index": self.index,
+                "_id": doc_id,
+                "doc": doc,
+                "doc_as_upsert": True
+            }
+            for doc_id, doc in docs.items()
+        ]
+        try:
+            helpers.bulk(self.es, actions)
+            log.info("✅ Wrote %d Wikipedia API documents to '%s'", len(actions), self.index)
+        except Exception as e:
+            log.error("❌ Failed to write %d Wikipedia API documents: %s", len(actions), e)
+
+    def _run(self):
+        while not self._closed:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Wait for a full batch or until the first document is flush_interval old
+            flush_at = time.monotonic() + self.flush_interval
+            while self._queue.qsize() + 1 < self.batch_size and time.monotonic() < flush_at and not self._closed:
+                time.sleep(min(0.05, self.flush_interval))
+
+            with self._flush_lock:
+                self._write(self._drain(first))
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        with self._flush_lock:
+            while not self._queue.empty():
+                self._write(self._drain())
+
+    def close(self):
+        self._closed = True
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_behind(index="wikipedia") -> WriteBehindQueue:
+    """
+    Returns the shared write-behind queue for this index, starting it on first use.
+    It writes through the BULK client, with the bulk pool and timeouts, not the client serving searches.
+    """
+    with _queues_lock:
+        if index not in _queues:
+            _queues[index] = WriteBehindQueue(get_client(BULK), index)
+        return _queues[index]
+
+
+@atexit.register
+def _flush_all():
+    for write_behind in list(_queues.values()):
+        write_behind.close()